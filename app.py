@@ -1,11 +1,22 @@
 from flask import Flask
-from models import db, Admin, mail
+from models import db, Admin, Doctor, SystemStat, mail
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash
+from password_utils import password_hasher
 from flask_mail import Message
 from email_utils import send_admin_creation_email
+from availability_utils import availability_cache
+from pagination_utils import page_url
+from booking_utils import reconcile_slots
+from search_utils import init_treatment_search, init_people_search
+from stats_utils import stats_cache, rebuild_stats
+from import_utils import import_users
+from audit_utils import audit_log
+from auth_utils import load_identity
+from otp_utils import otp_store
+from schema_utils import upgrade_schema
+import click
 
 def create_app():
     load_dotenv()
@@ -38,6 +49,30 @@ def create_app():
     
     mail.init_app(app)
 
+    app.config['AVAILABILITY_CACHE_SIZE'] = int(os.getenv("AVAILABILITY_CACHE_SIZE", 512))
+    app.config['SLOT_WINDOW_DAYS'] = int(os.getenv("SLOT_WINDOW_DAYS", 90))
+    app.config['AVAILABILITY_CACHE_TTL'] = float(os.getenv("AVAILABILITY_CACHE_TTL", 10))
+    availability_cache.init_app(app)
+    app.config['ADMIN_STATS_TTL'] = int(os.getenv("ADMIN_STATS_TTL", 30))
+    stats_cache.init_app(app)
+    app.config['AUDIT_QUEUE_SIZE'] = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+    app.config['AUDIT_BATCH_SIZE'] = int(os.getenv("AUDIT_BATCH_SIZE", 200))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0))
+    audit_log.init_app(app)
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config['PASSWORD_VERIFY_WORKERS'] = int(os.getenv("PASSWORD_VERIFY_WORKERS", 0))
+    app.config['PASSWORD_VERIFY_QUEUE'] = int(os.getenv("PASSWORD_VERIFY_QUEUE", 32))
+    app.config['PASSWORD_VERIFY_TIMEOUT'] = float(os.getenv("PASSWORD_VERIFY_TIMEOUT", 5))
+    password_hasher.init_app(app)
+    app.config['OTP_BACKEND'] = os.getenv("OTP_BACKEND", "database")
+    app.config['OTP_TTL'] = int(os.getenv("OTP_TTL", 600))
+    app.config['OTP_MAX_ATTEMPTS'] = int(os.getenv("OTP_MAX_ATTEMPTS", 5))
+    app.config['OTP_PURGE_INTERVAL'] = int(os.getenv("OTP_PURGE_INTERVAL", 300))
+    otp_store.init_app(app)
+    app.config['IMPORT_HASH_WORKERS'] = int(os.getenv("IMPORT_HASH_WORKERS", os.cpu_count() or 1))
+    app.add_template_global(page_url)
+    app.before_request(load_identity)
+
     from controllers.app_controller import app_bp
     from controllers.admin_controller import admin_bp
     from controllers.doctor_controller import doctor_bp
@@ -48,15 +83,55 @@ def create_app():
     app.register_blueprint(doctor_bp)
     app.register_blueprint(patient_bp)
 
+    @app.cli.command("reconcile-slots")
+    @click.option("--doctor-id", type=int, help="Only reconcile this doctor's slots.")
+    def reconcile_slots_command(doctor_id):
+        """Repairs slot statuses that drifted from their appointments."""
+        doctor_ids = [doctor_id] if doctor_id else [d for (d,) in db.session.query(Doctor.doctor_id)]
+        fixed = sum(reconcile_slots(d) for d in doctor_ids)
+        click.echo(f"Reconciled {fixed} slot(s) across {len(doctor_ids)} doctor(s).")
+
+    @app.cli.command("rebuild-stats")
+    def rebuild_stats_command():
+        """Recounts the system_stats counters from the tables."""
+        counters = rebuild_stats()
+        click.echo(f"Rebuilt {len(counters)} counter(s).")
+
+    @app.cli.command("import-users")
+    @click.argument("role", type=click.Choice(["doctor", "patient"]))
+    @click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+    @click.option("--no-email", is_flag=True, help="Do not send credential emails.")
+    def import_users_command(role, csv_file, no_email):
+        """Creates doctor or patient accounts from a CSV file."""
+        try:
+            result = import_users(role, csv_file, send_emails=not no_email)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for line, message in result.errors:
+            click.echo(f"line {line}: {message}", err=True)
+        click.echo(f"Imported {result.created} {role}(s), rejected {result.rejected} row(s).")
+
+    @app.cli.command("purge-otps")
+    def purge_otps_command():
+        """Deletes one-time codes that have expired."""
+        click.echo(f"Purged {otp_store.purge()} expired code(s).")
+
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        init_treatment_search(app)
+        init_people_search(app)
+
+        #fills the counters the first time this database is started with them
+        if not db.session.query(SystemStat.name).first():
+            rebuild_stats()
 
         admin = db.session.get(Admin, 1)
         if not admin:
             admin = Admin(
                 admin_id=1,
                 email=os.getenv("ADMIN_EMAIL"),
-                password=generate_password_hash(os.getenv("ADMIN_PASSWORD"))
+                password=password_hasher.hash(os.getenv("ADMIN_PASSWORD"))
             )
             db.session.add(admin)
             db.session.commit()
@@ -0,0 +1,170 @@
+from flask import request, session
+from models import db, AuditEvent
+from pagination_utils import keyset_paginate, decode_cursor, get_page_size
+from sqlalchemy import insert
+from datetime import datetime
+from threading import Thread, Lock, Event
+import atexit
+import json
+import os
+import queue
+import time
+
+AUDIT_PAGE_SIZE = 50
+
+class AuditLog:
+    """Append-only audit trail, written to audit_events by a background thread.
+
+    record() only puts the event on a bounded in-memory queue, so requests
+    never wait on the audit INSERT. The writer takes whatever has queued up
+    within flush_interval seconds, up to batch_size events, and inserts it
+    in one statement. When the queue is full new events are dropped and
+    counted instead of blocking the request; stats() reports the queue
+    depth, its high-water mark and the dropped and failed counts. Events
+    still queued when the process is killed outright are lost.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.app = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.high_water = 0
+        self.last_flush = None
+        self._queue = queue.Queue(max_queue)
+        self._lock = Lock()
+        self._stopping = Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.max_queue = app.config.get("AUDIT_QUEUE_SIZE", self.max_queue)
+        self.batch_size = app.config.get("AUDIT_BATCH_SIZE", self.batch_size)
+        self.flush_interval = app.config.get("AUDIT_FLUSH_INTERVAL", self.flush_interval)
+        self._queue = queue.Queue(self.max_queue)
+        self.app = app
+        app.extensions["audit_log"] = self
+        atexit.register(self.close)
+
+    def record(self, action, target_type=None, target_id=None, **details):
+        """Queues one event for whoever is signed in to the current request."""
+        if session.get("admin_id"):
+            actor_role, actor_id = "admin", session["admin_id"]
+        else:
+            actor_role, actor_id = session.get("role") or "anonymous", session.get("user_id")
+
+        event = {
+            "created_at": datetime.now(),
+            "actor_role": actor_role,
+            "actor_id": actor_id,
+            "action": action,
+            "target_type": target_type,
+            "target_id": target_id,
+            "details": json.dumps(details, default=str) if details else None,
+            "ip_address": request.remote_addr
+        }
+
+        self._start_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+            self.high_water = max(self.high_water, self._queue.qsize())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "high_water": self.high_water,
+                "recorded": self.recorded,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "last_flush": self.last_flush
+            }
+
+    def flush(self):
+        """Blocks until every queued event has been written or has failed."""
+        self._queue.join()
+
+    def close(self):
+        """Writes out what is still queued and stops the writer."""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=10)
+
+    def _start_writer(self):
+        #each worker process needs its own thread, a forked copy of the parent's does not run
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stopping.clear()
+                self._thread = Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            #let a batch build up for a moment instead of writing every event on its own
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0 or self._stopping.is_set():
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(AuditEvent), batch)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error writing {len(batch)} audit event(s): {e}")
+                with self._lock:
+                    self.failed += len(batch)
+                return
+
+        with self._lock:
+            self.written += len(batch)
+            self.last_flush = datetime.now()
+
+
+audit_log = AuditLog()
+
+def paginate_audit_events(query, arg="after"):
+    """Newest-first page of audit events, keyed on (created_at, audit_id)."""
+    after = decode_cursor(request.args.get(arg), (datetime, int))
+    return keyset_paginate(
+        query,
+        (AuditEvent.created_at, AuditEvent.audit_id),
+        key=lambda e: (e.created_at, e.audit_id),
+        after=after,
+        per_page=get_page_size(AUDIT_PAGE_SIZE),
+        descending=True
+    )
@@ -0,0 +1,53 @@
+from flask import g, session, request, flash, redirect, url_for
+from models import db, Admin, User, Doctor, Patient
+from sqlalchemy.orm import contains_eager, joinedload
+from functools import wraps
+
+def load_identity():
+    """Resolves who is signed in, once per request, onto g.
+
+    g.role is "admin", "doctor", "patient" or None. An admin session sets
+    g.admin; a doctor or patient session sets g.user and g.doctor or
+    g.patient from one joined query (the doctor's department comes with
+    it), so routes and templates read them without further lookups. A
+    session whose account no longer exists resolves to nobody.
+    """
+    g.role = g.admin = g.user = g.doctor = g.patient = None
+    if request.endpoint == "static":
+        return
+
+    if session.get("admin_id"):
+        g.admin = db.session.get(Admin, session["admin_id"])
+        g.role = "admin" if g.admin else None
+        return
+
+    role = session.get("role")
+    if not session.get("user_id") or role not in ("doctor", "patient"):
+        return
+
+    model = Doctor if role == "doctor" else Patient
+    query = (
+        model.query
+        .join(User, model.user_id == User.user_id)
+        .options(contains_eager(model.user))
+        .filter(model.user_id == session["user_id"])
+    )
+    if model is Doctor:
+        query = query.options(joinedload(Doctor.department))
+
+    profile = query.first()
+    if profile:
+        g.role, g.user = role, profile.user
+        setattr(g, role, profile)
+
+def login_required(role):
+    """Sends the request to the login page unless someone with `role` is signed in."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if g.role != role:
+                flash("Please log in first.", "error")
+                return redirect(url_for("mediconnect.login"))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,209 @@
+from models import db, Slot, AvailabilityRule
+from pagination_utils import build_page, SLOT_PAGE_SIZE
+from sqlalchemy.orm import selectinload
+from collections import OrderedDict, namedtuple
+from bisect import bisect_right, insort
+from datetime import date, datetime, timedelta
+from threading import Lock
+import time
+
+class FreeSlot(namedtuple("FreeSlot", ["date", "time", "slot_id"])):
+    """A bookable time. slot_id is 0 when a recurring rule offers it but no Slot row exists yet."""
+    __slots__ = ()
+
+    @property
+    def value(self):
+        """What the slot pickers submit: the slot_id, or the date and time for a rule-generated slot."""
+        if self.slot_id:
+            return str(self.slot_id)
+        return f"{self.date.isoformat()}T{self.time.strftime('%H:%M')}"
+
+def availability_window(days):
+    """Returns the (first, last) dates patients can currently book: today through today + days."""
+    today = date.today()
+    return today, today + timedelta(days=days)
+
+def free_slots_query(doctor_id, window):
+    """Free slots for a doctor inside the window, served by ix_slots_doctor_status_date_time."""
+    start, end = window
+    return (
+        db.session.query(Slot.date, Slot.time, Slot.slot_id)
+        .filter(
+            Slot.doctor_id == doctor_id,
+            Slot.status == "Available",
+            Slot.date >= start,
+            Slot.date <= end
+        )
+        .order_by(Slot.date, Slot.time, Slot.slot_id)
+    )
+
+def doctor_rules(doctor_id):
+    """A doctor's recurring rules with their exception dates."""
+    return (
+        AvailabilityRule.query
+        .options(selectinload(AvailabilityRule.exceptions))
+        .filter_by(doctor_id=doctor_id)
+        .all()
+    )
+
+def rule_offers(doctor_id, day, at, window):
+    """Whether one of the doctor's rules offers `day` at `at` inside the window."""
+    start, end = window
+    if not start <= day <= end:
+        return False
+    return (day, at) in rule_times(doctor_rules(doctor_id), (day, day))
+
+def rule_times(rules, window):
+    """Expands recurring rules into the set of (date, time) pairs they offer inside the window."""
+    start, end = window
+    offered = set()
+    for rule in rules:
+        first = max(start, rule.valid_from)
+        last = min(end, rule.valid_until) if rule.valid_until else end
+        skipped = {e.date for e in rule.exceptions}
+        step = timedelta(minutes=rule.interval_minutes)
+
+        day = first + timedelta(days=(rule.weekday - first.weekday()) % 7)
+        while day <= last:
+            if day not in skipped:
+                at = datetime.combine(day, rule.start_time)
+                stop = datetime.combine(day, rule.end_time)
+                while at + step <= stop:
+                    offered.add((day, at.time()))
+                    at += step
+            day += timedelta(days=7)
+    return offered
+
+def load_free_slots(doctor_id, window):
+    """Free slots inside the window, merging rule-generated times with materialized Slot rows.
+
+    A Slot row at a given date and time always wins over the rule, so a time
+    that has been materialized and booked is not offered again.
+    """
+    rules = doctor_rules(doctor_id)
+    if not rules:
+        return [FreeSlot(*row) for row in free_slots_query(doctor_id, window)]
+
+    start, end = window
+    materialized = (
+        db.session.query(Slot.date, Slot.time, Slot.slot_id, Slot.status)
+        .filter(Slot.doctor_id == doctor_id, Slot.date >= start, Slot.date <= end)
+        .all()
+    )
+
+    taken = set()
+    free = []
+    for day, at, slot_id, status in materialized:
+        taken.add((day, at))
+        if status == "Available":
+            free.append(FreeSlot(day, at, slot_id))
+
+    free.extend(FreeSlot(day, at, 0) for day, at in rule_times(rules, window) if (day, at) not in taken)
+    free.sort()
+    return free
+
+class AvailabilityCache:
+    """In-process LRU of each doctor's free slots, kept sorted by (date, time, slot_id).
+
+    Only slots inside the booking window are held, and an entry loaded on an
+    earlier day is reloaded so the window moves forward with the calendar.
+    Entries are patched in place by the booking, cancel and slot management paths
+    after they commit, so reads only hit the database on a miss. Every write bumps
+    a per-doctor version, and a miss only stores its result if no write landed
+    while it was querying. Writes made by other worker processes are not seen
+    here, so an entry is also reloaded once it is `ttl` seconds old; until then
+    another worker's change only shows up as a failed claim, which invalidates
+    the doctor's entry. A ttl of 0 turns the cache off.
+    """
+
+    def __init__(self, max_doctors=512, window_days=90, ttl=10):
+        self.max_doctors = max_doctors
+        self.window_days = window_days
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.max_doctors = app.config.get("AVAILABILITY_CACHE_SIZE", self.max_doctors)
+        self.window_days = app.config.get("SLOT_WINDOW_DAYS", self.window_days)
+        self.ttl = app.config.get("AVAILABILITY_CACHE_TTL", self.ttl)
+        app.extensions["availability_cache"] = self
+
+    def window(self):
+        return availability_window(self.window_days)
+
+    def get(self, doctor_id):
+        """Returns all of the doctor's free slots inside the booking window."""
+        slots = self._slots(doctor_id)
+        with self._lock:
+            return list(slots)
+
+    def page(self, doctor_id, after=None, per_page=SLOT_PAGE_SIZE):
+        """Returns the doctor's free slots that sort after the `after` (date, time, slot_id) key."""
+        slots = self._slots(doctor_id)
+        with self._lock:
+            start = bisect_right(slots, tuple(after)) if after else 0
+            rows = slots[start:start + per_page + 1]
+        return build_page(rows, per_page, key=tuple)
+
+    def _slots(self, doctor_id):
+        """Returns the cached list for a doctor, loading it from the database on a miss."""
+        window = self.window()
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry is not None and entry[0] == window and time.monotonic() < entry[2]:
+                self._entries.move_to_end(doctor_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self._versions.get(doctor_id, 0)
+
+        slots = load_free_slots(doctor_id, window)
+
+        with self._lock:
+            if self.ttl > 0 and self._versions.get(doctor_id, 0) == version:
+                self._entries[doctor_id] = (window, slots, time.monotonic() + self.ttl)
+                self._entries.move_to_end(doctor_id)
+                while len(self._entries) > self.max_doctors:
+                    self._entries.popitem(last=False)
+        return slots
+
+    def add(self, doctor_id, date, time, slot_id):
+        """Marks a slot as free in the doctor's cached entry."""
+        with self._lock:
+            self._bump(doctor_id)
+            entry = self._entries.get(doctor_id)
+            if entry is None:
+                return
+            (start, end), slots, _ = entry
+            if start <= date <= end and all(s.slot_id != slot_id for s in slots):
+                #a real row replaces any rule-generated entry at the same time
+                slots[:] = [s for s in slots if s.slot_id or (s.date, s.time) != (date, time)]
+                insort(slots, FreeSlot(date, time, slot_id))
+
+    def discard(self, doctor_id, slot_id):
+        """Drops a slot that has been booked, edited or deleted."""
+        with self._lock:
+            self._bump(doctor_id)
+            entry = self._entries.get(doctor_id)
+            if entry is not None:
+                entry[1][:] = [s for s in entry[1] if s.slot_id != slot_id]
+
+    def invalidate(self, doctor_id):
+        """Forgets the doctor's entry after a bulk change."""
+        with self._lock:
+            self._bump(doctor_id)
+            self._entries.pop(doctor_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _bump(self, doctor_id):
+        self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+
+
+availability_cache = AvailabilityCache()
@@ -0,0 +1,67 @@
+"""The admin dashboard numbers: the old per-department COUNT loop against system_stats and the TTL cache.
+
+    python benchmarks/bench_admin_dashboard.py [--departments 500] [--doctors 4] [--appointments 50000]
+
+Runs on a new SQLite file, or on TEST_DB_URI.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+from support import load_app, seed_bulk, QueryCounter
+
+app = load_app()
+from models import db, Department, Doctor, Patient, User, Appointment
+from stats_utils import read_dashboard_stats, dashboard_stats, stats_cache
+
+def dashboard_counts_loop():
+    """The numbers as admin_controller.dashboard used to compute them: nine COUNTs plus one per department."""
+    counts = {
+        "total_departments": Department.query.count(),
+        "total_doctors": Doctor.query.count(),
+        "total_patients": Patient.query.count(),
+        "total_appointments": Appointment.query.count(),
+        "chart_active_patients": Patient.query.join(User).filter(User.status == "active").count(),
+        "chart_active_doctors": Doctor.query.join(User).filter(User.status == "active").count(),
+        "chart_booked": Appointment.query.filter_by(status="Booked").count(),
+        "chart_completed": Appointment.query.filter_by(status="Completed").count(),
+        "chart_cancelled": Appointment.query.filter_by(status="Cancelled").count(),
+    }
+    counts["chart_dept_counts"] = [
+        Doctor.query.join(User).filter(Doctor.department_id == d.department_id, User.status == "active").count()
+        for d in Department.query.order_by(Department.name).all()
+    ]
+    return counts
+
+def measure(label, compute, repeat=20):
+    with QueryCounter(db.engine) as counter:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compute()
+        elapsed = (time.perf_counter() - started) / repeat
+    print(f"{label:<28} {elapsed * 1000:8.2f} ms  {counter.count / repeat:6.0f} statements per load")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--departments", type=int, default=500)
+    parser.add_argument("--doctors", type=int, default=4, help="doctors per department")
+    parser.add_argument("--appointments", type=int, default=50000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed_bulk(args.departments, args.doctors, args.appointments)
+        print(f"{args.departments} departments, {args.departments * args.doctors} doctors, {args.appointments} appointments on {db.engine.dialect.name}")
+
+        loop = dashboard_counts_loop()
+        stored = read_dashboard_stats()
+        assert all(loop[key] == stored[key] for key in loop), "system_stats disagrees with the tables"
+
+        measure("per-department COUNT loop", dashboard_counts_loop)
+        measure("system_stats", read_dashboard_stats)
+        stats_cache.invalidate()
+        measure(f"TTL cache ({stats_cache.ttl} s)", dashboard_stats)
+
+if __name__ == "__main__":
+    main()
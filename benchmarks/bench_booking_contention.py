@@ -0,0 +1,73 @@
+"""Many patients booking the same doctor's slots at once: bookings per second and double-bookings.
+
+    python benchmarks/bench_booking_contention.py [--threads 32] [--slots 200]
+
+Runs on a new SQLite file, or on TEST_DB_URI (e.g. a local PostgreSQL).
+"""
+import argparse
+import os
+import sys
+import time
+from threading import Thread, Lock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+from support import load_app, make_doctor, make_patient, make_slots
+
+app = load_app()
+from models import db, Appointment
+from booking_utils import book_slot
+from sqlalchemy import func
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--slots", type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        doctor_id = make_doctor().doctor_id
+        patient_ids = [make_patient().patient_id for _ in range(args.threads)]
+        slot_ids = make_slots(doctor_id, days=-(-args.slots // 8))[:args.slots]
+
+    wins, attempts, lock = [0], [0], Lock()
+
+    def worker(patient_id, offset):
+        #each thread walks the slots from a different starting point so they collide all the way through
+        order = slot_ids[offset:] + slot_ids[:offset]
+        with app.app_context():
+            for slot_id in order:
+                booked = book_slot(patient_id, slot_id, doctor_id) is not None
+                with lock:
+                    attempts[0] += 1
+                    wins[0] += booked
+
+    threads = [Thread(target=worker, args=(p, i * len(slot_ids) // args.threads)) for i, p in enumerate(patient_ids)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        per_slot = (
+            db.session.query(Appointment.slot_id, func.count())
+            .filter(Appointment.doctor_id == doctor_id)
+            .group_by(Appointment.slot_id)
+            .having(func.count() > 1)
+            .all()
+        )
+        dialect = db.engine.dialect.name
+
+    print(f"database        {dialect}")
+    print(f"threads         {args.threads}")
+    print(f"attempts        {attempts[0]}")
+    print(f"bookings        {wins[0]} of {len(slot_ids)} slots")
+    print(f"double-booked   {len(per_slot)}")
+    print(f"elapsed         {elapsed:.2f} s")
+    print(f"bookings/s      {wins[0] / elapsed:.1f}")
+    print(f"attempts/s      {attempts[0] / elapsed:.1f}")
+    sys.exit(1 if per_slot or wins[0] != len(slot_ids) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Cloning a day of slots across a date range: batched INSERT ... SELECT against the old per-pair loop.
+
+    python benchmarks/bench_clone_slots.py [--slots 20] [--days 90]
+
+Runs on a new SQLite file, or on TEST_DB_URI.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+from support import load_app, make_doctor, make_slots, QueryCounter
+
+app = load_app()
+from models import db, Slot
+from booking_utils import bulk_clone_slots
+
+def clone_slots_loop(doctor_id, source_date, start_date, end_date):
+    """The clone as doctor_controller used to do it: one lookup per (date, time) pair, one add per new slot."""
+    source = Slot.query.filter_by(doctor_id=doctor_id, date=source_date).all()
+    created = 0
+    day = start_date
+    while day <= end_date:
+        for slot in source:
+            if not Slot.query.filter_by(doctor_id=doctor_id, date=day, time=slot.time).first():
+                db.session.add(Slot(doctor_id=doctor_id, date=day, time=slot.time, status="Available"))
+                created += 1
+        day += timedelta(days=1)
+    db.session.commit()
+    return created
+
+def measure(label, clone, doctor_id, source, start, end):
+    with QueryCounter(db.engine) as counter:
+        started = time.perf_counter()
+        result = clone(doctor_id, source, start, end)
+        elapsed = time.perf_counter() - started
+    print(f"{label:<22} {elapsed * 1000:8.1f} ms  {counter.count:6d} statements  -> {result}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slots", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    source = date.today() + timedelta(days=1)
+    start, end = source + timedelta(days=1), source + timedelta(days=args.days)
+
+    with app.app_context():
+        print(f"{args.slots} slots x {args.days} days on {db.engine.dialect.name}")
+        for label, clone in (("per-pair loop", clone_slots_loop), ("bulk clone", bulk_clone_slots)):
+            doctor_id = make_doctor().doctor_id
+            make_slots(doctor_id, per_day=args.slots, start=source)
+            measure(f"{label}, empty", clone, doctor_id, source, start, end)
+            measure(f"{label}, rerun", clone, doctor_id, source, start, end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Deleting a department with all its doctors, slots, appointments and treatments.
+
+    python benchmarks/bench_department_delete.py [--appointments 100000] [--doctors 50]
+
+Compares the ON DELETE CASCADE path the app uses with the ORM walking and
+deleting every child row, which is what the delete-orphan cascades used to
+do. Runs on a new SQLite file, or on TEST_DB_URI.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+from support import load_app, seed_bulk, QueryCounter
+
+app = load_app()
+from models import db, Department, Slot, Appointment, Treatment
+
+def delete_department_orm(department_id):
+    """Loads every child and deletes it one row at a time before the department."""
+    department = db.session.get(Department, department_id)
+    for doctor in department.doctors:
+        for appointment in doctor.appointments:
+            if appointment.treatment:
+                db.session.delete(appointment.treatment)
+            db.session.delete(appointment)
+        for slot in doctor.slots:
+            db.session.delete(slot)
+        db.session.flush()
+        db.session.expire(doctor, ["appointments", "slots"])
+    #the emptied doctors go with the department through its delete-orphan cascade
+    db.session.delete(department)
+    db.session.commit()
+
+def delete_department_cascade(department_id):
+    """What admin_controller.delete_department does."""
+    db.session.delete(db.session.get(Department, department_id))
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--doctors", type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        print(f"{args.doctors} doctors, {args.appointments} appointments with treatments on {db.engine.dialect.name}")
+        for label, delete in (("ORM row by row", delete_department_orm), ("ON DELETE CASCADE", delete_department_cascade)):
+            (department_id,) = seed_bulk(1, args.doctors, args.appointments, treatments=True)
+            db.session.expunge_all()
+            with QueryCounter(db.engine) as counter:
+                started = time.perf_counter()
+                delete(department_id)
+                elapsed = time.perf_counter() - started
+            left = sum(model.query.count() for model in (Slot, Appointment, Treatment))
+            print(f"{label:<20} {elapsed:8.2f} s  {counter.count:7d} statements  {left} rows left")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Login throughput, and how slow other pages get while logins are hashing.
+
+    python benchmarks/bench_login.py [--method scrypt] [--workers 0] [--clients 16] [--seconds 10]
+
+Serves the app from a threaded server in this process. --clients threads
+keep posting a correct login while one probe loads /login every 50 ms.
+--method and --workers are PASSWORD_HASH_METHOD and PASSWORD_VERIFY_WORKERS.
+Runs on a new SQLite file, or on TEST_DB_URI.
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import sys
+import time
+import urllib.parse
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+from support import load_app, make_patient
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    os.environ["TEST_PASSWORD_HASH_METHOD"] = args.method
+    os.environ["PASSWORD_VERIFY_WORKERS"] = str(args.workers)
+    app = load_app()
+    from werkzeug.serving import make_server
+
+    with app.app_context():
+        email = make_patient(password="secret").user.email
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    body = urllib.parse.urlencode({"email": email, "password": "secret"})
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    logins, busy, probes = [0], [0], []
+    stop = time.monotonic() + args.seconds
+
+    def request(method, path, payload=None):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        conn.request(method, path, payload, headers if payload else {})
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def login():
+        while time.monotonic() < stop:
+            status, page = request("POST", "/login", body)
+            if status == 302:
+                logins[0] += 1
+            elif b"Too many sign-ins" in page:
+                busy[0] += 1
+
+    def probe():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            request("GET", "/login")
+            probes.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.05)
+
+    threads = [Thread(target=login) for _ in range(args.clients)] + [Thread(target=probe)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    probes.sort()
+    print(f"method {args.method}, {args.workers} verify worker(s), {args.clients} clients, {os.cpu_count()} CPU(s)")
+    print(f"logins/s      {logins[0] / args.seconds:.1f}")
+    print(f"turned away   {busy[0]}")
+    print(f"probe p50     {statistics.median(probes):.0f} ms")
+    print(f"probe p95     {probes[int(len(probes) * 0.95)]:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+from models import db, Slot, Appointment, Doctor, Patient, User
+from availability_utils import availability_cache, rule_offers, FreeSlot
+from stats_utils import bump_stats, status_stat, user_status_deltas
+from sqlalchemy import update, insert, exists, case, select, or_, union_all, literal, Integer, String, Date, Time
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, timedelta
+
+CLONE_BATCH_SIZE = 200
+MAX_BULK_APPOINTMENTS = 200
+MAX_BULK_USERS = 200
+
+def claim_slot(slot_id, doctor_id=None):
+    """Flips a slot from Available to Booked with a single conditional UPDATE.
+
+    Returns True only for the caller whose UPDATE actually matched the row, so
+    two concurrent requests can never both win the same slot. Slots dated in
+    the past, and slots of a blacklisted doctor, can no longer be claimed.
+    """
+    doctor_active = exists().where(
+        Doctor.doctor_id == Slot.doctor_id,
+        User.user_id == Doctor.user_id,
+        User.status == "active"
+    )
+    stmt = update(Slot).where(
+        Slot.slot_id == slot_id,
+        Slot.status == "Available",
+        Slot.date >= date.today(),
+        doctor_active
+    )
+    if doctor_id is not None:
+        stmt = stmt.where(Slot.doctor_id == doctor_id)
+
+    result = db.session.execute(
+        stmt.values(status="Booked").execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def book_slot(patient_id, slot_id, doctor_id):
+    """Claims the slot and creates the appointment in the same transaction.
+
+    Returns the new Appointment, or None if the slot was already taken.
+    """
+    try:
+        if not claim_slot(slot_id, doctor_id):
+            db.session.rollback()
+            availability_cache.invalidate(doctor_id)
+            return None
+
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            slot_id=slot_id,
+            status="Booked",
+            created_at=datetime.now()
+        )
+        db.session.add(appointment)
+        db.session.commit()
+        availability_cache.discard(doctor_id, slot_id)
+        return appointment
+
+    except IntegrityError:
+        #unique slot_id on appointments is the last line of defence
+        db.session.rollback()
+        availability_cache.invalidate(doctor_id)
+        return None
+
+def release_slot(slot_id):
+    """Puts a booked slot back into the Available pool."""
+    db.session.execute(
+        update(Slot)
+        .where(Slot.slot_id == slot_id)
+        .values(status="Available")
+        .execution_options(synchronize_session=False)
+    )
+
+def swap_slot(appointment_id, old_slot, new_slot_id, doctor_id):
+    """Moves an appointment from old_slot to new_slot_id in one transaction.
+
+    The new slot is claimed first; if that fails nothing else has been written,
+    so the swap backs out with a single rollback. The appointment row is only
+    repointed if it still holds old_slot, which stops two concurrent
+    reschedules of the same appointment from both going through.
+    """
+    old_slot_id = old_slot.slot_id if old_slot else None
+    old_free = FreeSlot(old_slot.date, old_slot.time, old_slot_id) if old_slot else None
+
+    try:
+        if not claim_slot(new_slot_id, doctor_id):
+            db.session.rollback()
+            availability_cache.invalidate(doctor_id)
+            return False
+
+        if old_slot_id:
+            release_slot(old_slot_id)
+            holds_old_slot = Appointment.slot_id == old_slot_id
+        else:
+            holds_old_slot = Appointment.slot_id.is_(None)
+
+        #a cancelled appointment is booked again by rescheduling it
+        old_status = db.session.query(Appointment.status).filter_by(appointment_id=appointment_id).scalar()
+        result = db.session.execute(
+            update(Appointment)
+            .where(Appointment.appointment_id == appointment_id, Appointment.status == old_status, holds_old_slot)
+            .values(slot_id=new_slot_id, status="Booked")
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return False
+        if old_status != "Booked":
+            bump_stats(db.session.connection(), {status_stat(old_status): -1, status_stat("Booked"): 1})
+
+        db.session.commit()
+
+    except IntegrityError:
+        db.session.rollback()
+        availability_cache.invalidate(doctor_id)
+        return False
+
+    availability_cache.discard(doctor_id, new_slot_id)
+    if old_free:
+        availability_cache.add(doctor_id, *old_free)
+    return True
+
+def reconcile_slots(doctor_id):
+    """Repairs slot status drift for one doctor with a single set-based UPDATE.
+
+    A slot is Booked exactly when a Booked or Completed appointment holds it.
+    Returns the number of slots that were corrected.
+    """
+    held = exists().where(
+        Appointment.slot_id == Slot.slot_id,
+        Appointment.status.in_(["Booked", "Completed"])
+    )
+    expected = case((held, "Booked"), else_="Available")
+
+    result = db.session.execute(
+        update(Slot)
+        .where(Slot.doctor_id == doctor_id, Slot.status != expected)
+        .values(status=expected)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    availability_cache.invalidate(doctor_id)
+    return result.rowcount
+
+def insert_new_slots(rows):
+    """Inserts slot rows in one INSERT ... SELECT, skipping (doctor, date, time) pairs that already exist.
+
+    The NOT EXISTS guard works whether or not the database has
+    uq_slots_doctor_date_time; where it does, a row inserted concurrently
+    by another request raises IntegrityError instead of being duplicated.
+    Returns how many rows were actually created.
+    """
+    source = union_all(*(
+        select(
+            literal(row["doctor_id"], Integer).label("doctor_id"),
+            literal(row["date"], Date).label("date"),
+            literal(row["time"], Time).label("time"),
+            literal(row["status"], String).label("status")
+        )
+        for row in rows
+    )).subquery()
+    taken = exists().where(Slot.doctor_id == source.c.doctor_id, Slot.date == source.c.date, Slot.time == source.c.time)
+
+    stmt = insert(Slot).from_select(["doctor_id", "date", "time", "status"], select(source).where(~taken))
+    return db.session.execute(stmt).rowcount
+
+def bulk_clone_slots(doctor_id, source_date, start_date, end_date):
+    """Copies a day's slot times onto every date in start_date..end_date.
+
+    The whole (date x time) set is inserted in multi-row batches that skip
+    pairs the doctor already has, instead of one lookup per pair. If another
+    request creates one of the slots meanwhile, the clone is rolled back
+    and run once more. Returns (created, skipped), or None if the source
+    day has no slots.
+    """
+    times = [t for (t,) in db.session.query(Slot.time).filter_by(doctor_id=doctor_id, date=source_date).distinct().order_by(Slot.time)]
+    if not times:
+        return None
+
+    days = (end_date - start_date).days + 1
+    rows = [
+        {"doctor_id": doctor_id, "date": start_date + timedelta(days=i), "time": t, "status": "Available"}
+        for i in range(days)
+        for t in times
+    ]
+
+    for attempt in range(2):
+        try:
+            created = 0
+            for i in range(0, len(rows), CLONE_BATCH_SIZE):
+                created += insert_new_slots(rows[i:i + CLONE_BATCH_SIZE])
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+
+    availability_cache.invalidate(doctor_id)
+    return created, len(rows) - created
+
+def resolve_slot(doctor_id, choice):
+    """Turns a slot picker value into a slot_id.
+
+    Plain ids are returned as they are. A "YYYY-MM-DDTHH:MM" value is a time
+    offered by one of the doctor's recurring rules; its Slot row is created
+    here, on first booking, so the table only grows with bookings. Returns
+    None if the value is not something the doctor actually offers.
+    """
+    choice = (choice or "").strip()
+    if choice.isdigit():
+        return int(choice)
+
+    try:
+        when = datetime.strptime(choice, "%Y-%m-%dT%H:%M")
+    except ValueError:
+        return None
+
+    day, at = when.date(), when.time()
+    if not rule_offers(doctor_id, day, at, availability_cache.window()):
+        return None
+
+    try:
+        created = insert_new_slots([{"doctor_id": doctor_id, "date": day, "time": at, "status": "Available"}])
+        db.session.commit()
+    except IntegrityError:
+        #another booking created the same slot first; use theirs
+        db.session.rollback()
+        created = 0
+    if created:
+        availability_cache.invalidate(doctor_id)
+
+    return db.session.query(Slot.slot_id).filter_by(doctor_id=doctor_id, date=day, time=at).order_by(Slot.slot_id).limit(1).scalar()
+
+def bulk_update_appointments(doctor_id, appointment_ids, status):
+    """Marks many of a doctor's Booked appointments Completed or Cancelled in one transaction.
+
+    Only Booked appointments whose patient is still active are touched. The
+    slot and appointment changes are two set-based UPDATEs whatever the batch
+    size, and cancelled appointments give their slots back. Returns the
+    (appointment_id, email, full_name, date, time) rows that changed, for the
+    status emails.
+    """
+    eligible = (
+        select(Appointment.appointment_id)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .where(
+            Appointment.appointment_id.in_(appointment_ids),
+            Appointment.doctor_id == doctor_id,
+            Appointment.status == "Booked",
+            User.status == "active"
+        )
+    )
+    rows = (
+        db.session.query(Appointment.appointment_id, User.email, User.full_name, Slot.date, Slot.time)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .filter(Appointment.appointment_id.in_(eligible))
+        .all()
+    )
+    if not rows:
+        return []
+
+    ids = [row.appointment_id for row in rows]
+    held_slots = select(Appointment.slot_id).where(Appointment.appointment_id.in_(ids), Appointment.status == "Booked")
+
+    #slots first, while the appointments still point at them
+    db.session.execute(
+        update(Slot)
+        .where(Slot.slot_id.in_(held_slots))
+        .values(status="Available" if status == "Cancelled" else "Booked")
+        .execution_options(synchronize_session=False)
+    )
+
+    values = {"status": status}
+    if status == "Cancelled":
+        values["slot_id"] = None
+    changed = db.session.execute(
+        update(Appointment)
+        .where(Appointment.appointment_id.in_(ids), Appointment.status == "Booked")
+        .values(**values)
+        .returning(Appointment.appointment_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    bump_stats(db.session.connection(), {status_stat("Booked"): -len(changed), status_stat(status): len(changed)})
+
+    db.session.commit()
+    if status == "Cancelled":
+        availability_cache.invalidate(doctor_id)
+
+    changed = set(changed)
+    return [row for row in rows if row.appointment_id in changed]
+
+def release_user_slots(user_ids):
+    """Frees the slots held by the users' appointments, as doctor or as patient, ahead of deleting the accounts.
+
+    The appointments go with the users through ON DELETE CASCADE, which
+    would leave their slots Booked with nothing holding them. Runs in the
+    caller's transaction as one UPDATE; returns the ids of the doctors
+    whose free slots changed, to invalidate once the delete commits.
+    """
+    doctor_ids = select(Doctor.doctor_id).where(Doctor.user_id.in_(user_ids))
+    patient_ids = select(Patient.patient_id).where(Patient.user_id.in_(user_ids))
+    held = select(Appointment.slot_id).where(
+        Appointment.status.in_(["Booked", "Completed"]),
+        or_(Appointment.doctor_id.in_(doctor_ids), Appointment.patient_id.in_(patient_ids))
+    )
+    return set(db.session.scalars(
+        update(Slot)
+        .where(Slot.slot_id.in_(held), Slot.status == "Booked")
+        .values(status="Available")
+        .returning(Slot.doctor_id)
+        .execution_options(synchronize_session=False)
+    ))
+
+def blacklist_users(user_ids):
+    """Deactivates users and clears their future bookings in one transaction.
+
+    Future Booked appointments of the users, as doctor or as patient, are
+    cancelled and their slots handed back. A blacklisted doctor's slots are
+    kept: they are hidden and cannot be claimed while the doctor is
+    inactive, and are bookable again once the doctor is unblacklisted.
+    Everything is a handful of set-based statements whatever the number of
+    users. Returns (summary, rows): counts of what changed, and the
+    (email, full_name, doctor_name, date, time) rows of the cancelled
+    appointments whose patients are still active, for the emails.
+    """
+    doctor_ids = select(Doctor.doctor_id).where(Doctor.user_id.in_(user_ids))
+    patient_ids = select(Patient.patient_id).where(Patient.user_id.in_(user_ids))
+    today = date.today()
+
+    doctor_user = aliased(User)
+    rows = (
+        db.session.query(
+            Appointment.appointment_id, Appointment.doctor_id, User.user_id, User.email, User.full_name,
+            doctor_user.full_name.label("doctor_name"), Slot.date, Slot.time
+        )
+        .join(Slot, Appointment.slot_id == Slot.slot_id)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .outerjoin(Doctor, Appointment.doctor_id == Doctor.doctor_id)
+        .outerjoin(doctor_user, Doctor.user_id == doctor_user.user_id)
+        .filter(
+            Appointment.status == "Booked",
+            Slot.date >= today,
+            or_(Appointment.doctor_id.in_(doctor_ids), Appointment.patient_id.in_(patient_ids))
+        )
+        .all()
+    )
+    ids = [row.appointment_id for row in rows]
+    connection = db.session.connection()
+
+    #slots first, while the appointments still point at them
+    freed = db.session.execute(
+        update(Slot)
+        .where(Slot.slot_id.in_(select(Appointment.slot_id).where(Appointment.appointment_id.in_(ids))))
+        .values(status="Available")
+        .execution_options(synchronize_session=False)
+    ).rowcount if ids else 0
+
+    cancelled = db.session.execute(
+        update(Appointment)
+        .where(Appointment.appointment_id.in_(ids), Appointment.status == "Booked")
+        .values(status="Cancelled", slot_id=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount if ids else 0
+
+    deactivated = db.session.scalars(
+        update(User)
+        .where(User.user_id.in_(user_ids), User.status == "active")
+        .values(status="inactive")
+        .returning(User.user_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    deltas = user_status_deltas(connection, deactivated, -1) if deactivated else {}
+    deltas[status_stat("Booked")] = -cancelled
+    deltas[status_stat("Cancelled")] = cancelled
+    bump_stats(connection, deltas)
+
+    db.session.commit()
+
+    affected_doctors = {row.doctor_id for row in rows} | set(db.session.scalars(doctor_ids))
+    for doctor_id in affected_doctors:
+        availability_cache.invalidate(doctor_id)
+
+    blacklisted = set(user_ids)
+    notify = [row for row in rows if row.user_id not in blacklisted]
+    summary = {
+        "users": len(deactivated),
+        "appointments_cancelled": cancelled,
+        "slots_freed": freed,
+        "patients_notified": len(notify)
+    }
+    return summary, notify
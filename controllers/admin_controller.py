@@ -1,84 +1,46 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from models import db, Admin, User, Doctor, Patient, Appointment, Department, Slot, Treatment
-from datetime import datetime
-from sqlalchemy import or_
-from werkzeug.security import generate_password_hash
-from email_utils import send_doctor_credentials_email
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, g
+from models import db, Admin, User, Doctor, Patient, Department, AuditEvent
+from datetime import datetime, date
+import io
+from sqlalchemy.orm import contains_eager
+from password_utils import password_hasher
+from email_utils import send_doctor_credentials_email, send_appointment_status_email, email_batch
+from booking_utils import blacklist_users, release_user_slots, MAX_BULK_USERS
+from availability_utils import availability_cache
+from pagination_utils import paginate_doctors, paginate_patients, MAX_PAGE_SIZE
+from history_utils import paginate_patient_history, appointments_query, filter_appointments, paginate_appointments, parse_hour_range
+from stats_utils import dashboard_stats
+from export_utils import EXPORTS, EXPORT_FORMATS, stream_export
+from import_utils import import_users, IMPORT_COLUMNS
+from audit_utils import audit_log, paginate_audit_events
+from search_utils import search_treatments, search_people, ranked_people, typeahead_people, filter_patients, filter_doctors
+from auth_utils import login_required
 
 admin_bp = Blueprint("mediconnect_admin", __name__, url_prefix="/admin")
 
 @admin_bp.route("/dashboard")
+@login_required("admin")
 def dashboard():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
-    total_departments = Department.query.count()
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.count()
-
-    #system overview
-    chart_active_patients = Patient.query.join(User).filter(User.status == 'active').count()
-    chart_active_doctors = Doctor.query.join(User).filter(User.status == 'active').count()
-    
-    #doctors per department
-    chart_dept_labels = []
-    chart_dept_counts = []
-    
-    departments = Department.query.order_by(Department.name).all()
-    
-    for dept in departments:
-        count = Doctor.query.join(User).filter(Doctor.department_id == dept.department_id,User.status == 'active').count()
-        chart_dept_labels.append(dept.name)
-        chart_dept_counts.append(count)
-
-    #appointment status pie chart
-    chart_booked = Appointment.query.filter_by(status='Booked').count()
-    chart_completed = Appointment.query.filter_by(status='Completed').count()
-    chart_cancelled = Appointment.query.filter_by(status='Cancelled').count()
-
-    return render_template(
-        "admin/dashboard.html",
-        total_departments=total_departments,
-        total_doctors=total_doctors,
-        total_patients=total_patients,
-        total_appointments=total_appointments,   
-        chart_active_patients=chart_active_patients,
-        chart_active_doctors=chart_active_doctors,
-        chart_dept_labels=chart_dept_labels,
-        chart_dept_counts=chart_dept_counts,
-        chart_booked=chart_booked,
-        chart_completed=chart_completed,
-        chart_cancelled=chart_cancelled
-    )
+    return render_template("admin/dashboard.html", **dashboard_stats())
 
 
 @admin_bp.route("/profile", methods=["GET", "POST"])
+@login_required("admin")
 def profile():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    admin = Admin.query.get(admin_id)
-    if not admin:
-        flash("Admin profile not found.", "error")
-        return redirect(url_for("mediconnect_admin.dashboard"))
+    admin = g.admin
 
     if request.method == "POST":
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "").strip()
 
-        if Admin.query.filter(Admin.email == email, Admin.admin_id != admin_id).first():
+        if Admin.query.filter(Admin.email == email, Admin.admin_id != admin.admin_id).first():
             flash("Email already exists for another Admin.", "error")
             return redirect(url_for("mediconnect_admin.profile"))
         
         if email:
             admin.email = email
         if password:
-            admin.password = generate_password_hash(password)
+            admin.password = password_hasher.hash(password)
 
         db.session.commit()
         flash("Admin profile updated successfully.", "success")
@@ -87,12 +49,8 @@ def profile():
 
 
 @admin_bp.route("/add-doctor", methods=["GET", "POST"])
+@login_required("admin")
 def add_doctor():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     if request.method == "POST":
 
         full_name = request.form.get("full_name", "").strip()
@@ -116,7 +74,7 @@ def add_doctor():
             new_user = User(
                 full_name=full_name,
                 email=email,
-                password=generate_password_hash(password),
+                password=password_hasher.hash(password),
                 role="doctor",
                 phone_no=phone_no,
                 status="active"
@@ -132,6 +90,7 @@ def add_doctor():
             )
             db.session.add(new_doctor)
             db.session.commit()
+            audit_log.record("add_doctor", "doctor", new_doctor.doctor_id, email=email)
 
             send_doctor_credentials_email(full_name, email, password)
             flash("Doctor added successfully.", "success")
@@ -146,40 +105,50 @@ def add_doctor():
     return render_template("admin/add_doctor.html", departments=departments)
 
 
+@admin_bp.route("/import-users", methods=["GET", "POST"])
+@login_required("admin")
+def import_users_view():
+    role = request.form.get("role", "doctor")
+    result = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if role not in IMPORT_COLUMNS or not upload or not upload.filename:
+            flash("Choose an account type and a CSV file.", "error")
+            return redirect(url_for("mediconnect_admin.import_users_view"))
+
+        #read straight from the upload so large files are never held in memory as a whole
+        try:
+            result = import_users(role, io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline=""))
+            audit_log.record("import_users", role, None, file=upload.filename, created=result.created, rejected=result.rejected)
+        except (ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            flash(f"Import stopped: {e}", "error")
+            return redirect(url_for("mediconnect_admin.import_users_view"))
+
+    return render_template("admin/import_users.html", role=role, result=result, columns=IMPORT_COLUMNS)
+
+
 @admin_bp.route("/doctors")
+@login_required("admin")
 def view_doctors():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     query = request.args.get("q", "").strip()
     search_by = request.args.get("search_by", "name")
 
     doctors_query = Doctor.query.join(User).outerjoin(Department)
+    doctors = paginate_doctors(filter_doctors(doctors_query, query, search_by))
 
-    if query:
-        if search_by == "name":
-            doctors_query = doctors_query.filter(User.full_name.ilike(f"%{query}%"))
-        elif search_by == "email":
-            doctors_query = doctors_query.filter(User.email.ilike(f"%{query}%"))
-        elif search_by == "department":
-            doctors_query = doctors_query.filter(Department.name.ilike(f"%{query}%"))
-        elif search_by == "status":
-            doctors_query = doctors_query.filter(User.status.ilike(f"%{query}%"))
-
-    doctors = doctors_query.all()
+    #no name contains the query: show the closest spellings instead, best match first
+    if query and search_by == "name" and not doctors and not request.args.get("after"):
+        hits = search_people(query, "doctor", MAX_PAGE_SIZE, field="name")
+        doctors_query = doctors_query.options(contains_eager(Doctor.user), contains_eager(Doctor.department))
+        doctors = ranked_people(doctors_query, hits, lambda d: d.user_id)
 
     return render_template("admin/view_doctors.html", doctors=doctors, query=query)
 
 
 @admin_bp.route("/edit-doctor/<int:doctor_id>", methods=["GET", "POST"])
+@login_required("admin")
 def edit_doctor(doctor_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
     doctor = Doctor.query.get_or_404(doctor_id)
     departments = Department.query.order_by(Department.name).all()
 
@@ -204,13 +173,14 @@ def edit_doctor(doctor_id):
             doctor.user.full_name = full_name
             doctor.user.email = email
             if password:
-                doctor.user.password = generate_password_hash(password)
+                doctor.user.password = password_hasher.hash(password)
             doctor.user.phone_no = phone_no
             doctor.qualification = qualification
             doctor.experience_years = int(experience) if experience.isdigit() else 0
             doctor.department_id = int(department_id) if department_id else None
 
             db.session.commit()
+            audit_log.record("edit_doctor", "doctor", doctor_id, password_changed=bool(password))
             flash("Doctor details updated successfully.", "success")
             return redirect(url_for("mediconnect_admin.view_doctors"))
 
@@ -223,19 +193,19 @@ def edit_doctor(doctor_id):
 
 
 @admin_bp.route("/remove-doctor/<int:doctor_id>", methods=["POST"])
+@login_required("admin")
 def remove_doctor(doctor_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     doctor = Doctor.query.get_or_404(doctor_id)
     user = doctor.user
 
     try:
         if user:
+            affected_doctors = release_user_slots([user.user_id]) | {doctor_id}
             db.session.delete(user)
             db.session.commit()
+            for affected in affected_doctors:
+                availability_cache.invalidate(affected)
+            audit_log.record("remove_doctor", "doctor", doctor_id, email=user.email)
             flash("Doctor removed successfully.", "success")
         return redirect(url_for("mediconnect_admin.view_doctors"))
     except Exception as e:
@@ -245,46 +215,56 @@ def remove_doctor(doctor_id):
 
 
 @admin_bp.route("/patients")
+@login_required("admin")
 def view_patients():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     query = request.args.get("q", "").strip()
     search_by = request.args.get("search_by", "name")
 
     patients_query = Patient.query.join(User)
+    patients = paginate_patients(filter_patients(patients_query, query, search_by))
 
-    if query:
-        if search_by == "name":
-            patients_query = patients_query.filter(User.full_name.ilike(f"%{query}%"))
-        elif search_by == "id":
-            patients_query = patients_query.filter(Patient.patient_id.cast(db.String).ilike(f"%{query}%"))
-        elif search_by == "email":
-            patients_query = patients_query.filter(User.email.ilike(f"%{query}%"))
-        elif search_by == "phone":
-            patients_query = patients_query.filter(User.phone_no.ilike(f"%{query}%"))
-        elif search_by == "gender":
-            patients_query = patients_query.filter(Patient.gender.ilike(f"%{query}%"))
-        elif search_by == "emergency":
-            patients_query = patients_query.filter(Patient.emergency_contact.ilike(f"%{query}%"))
-        elif search_by == "status":
-            patients_query = patients_query.filter(User.status.ilike(f"%{query}%"))
-
-    patients = patients_query.all()
-
+    #no name contains the query: show the closest spellings instead, best match first
+    if query and search_by == "name" and not patients and not request.args.get("after"):
+        hits = search_people(query, "patient", MAX_PAGE_SIZE, field="name")
+        patients = ranked_people(patients_query.options(contains_eager(Patient.user)), hits, lambda p: p.user_id)
 
     return render_template("admin/view_patients.html", patients=patients, query=query)
 
 
+@admin_bp.route("/search/people")
+def typeahead():
+    if g.role != "admin":
+        return jsonify({"error": "Please log in first."}), 401
+
+    role = request.args.get("role")
+    if role not in ["patient", "doctor"]:
+        role = None
+
+    results = typeahead_people(request.args.get("q", ""), role)
+    for r in results:
+        if r["patient_id"]:
+            r["url"] = url_for("mediconnect_admin.edit_patient", patient_id=r["patient_id"])
+        elif r["doctor_id"]:
+            r["url"] = url_for("mediconnect_admin.edit_doctor", doctor_id=r["doctor_id"])
+    return jsonify(results)
+
+
+@admin_bp.route("/export/<dataset>")
+@login_required("admin")
+def export(dataset):
+    fmt = request.args.get("format", "csv")
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        flash("Unknown export.", "error")
+        return redirect(url_for("mediconnect_admin.dashboard"))
+
+    headers, query = EXPORTS[dataset](request.args)
+    audit_log.record("export", dataset, None, filters=request.args.to_dict())
+    return stream_export(dataset, headers, query, fmt)
+
+
 @admin_bp.route("/edit-patient/<int:patient_id>", methods=["GET", "POST"])
+@login_required("admin")
 def edit_patient(patient_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     patient = Patient.query.get_or_404(patient_id)
     user = patient.user
 
@@ -311,7 +291,7 @@ def edit_patient(patient_id):
             user.full_name = full_name
             user.email = email
             if password:
-                user.password = generate_password_hash(password)
+                user.password = password_hasher.hash(password)
             user.phone_no = phone_no
 
             patient.dob = datetime.strptime(dob, "%Y-%m-%d").date()
@@ -321,6 +301,7 @@ def edit_patient(patient_id):
             patient.emergency_contact = emergency_contact
 
             db.session.commit()
+            audit_log.record("edit_patient", "patient", patient_id, password_changed=bool(password))
             flash("Patient details updated successfully.", "success")
             return redirect(url_for("mediconnect_admin.view_patients"))
 
@@ -333,19 +314,19 @@ def edit_patient(patient_id):
 
 
 @admin_bp.route("/remove-patient/<int:patient_id>", methods=["POST"])
+@login_required("admin")
 def remove_patient(patient_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     patient = Patient.query.get_or_404(patient_id)
     user = patient.user
 
     try:
         if user:
+            affected_doctors = release_user_slots([user.user_id])
             db.session.delete(user)
             db.session.commit()
+            for doctor_id in affected_doctors:
+                availability_cache.invalidate(doctor_id)
+            audit_log.record("remove_patient", "patient", patient_id, email=user.email)
             flash("Patient removed successfully.", "success")
         return redirect(url_for("mediconnect_admin.view_patients"))
     except Exception as e:
@@ -355,24 +336,11 @@ def remove_patient(patient_id):
 
 
 @admin_bp.route("/patient-history/<int:patient_id>")
+@login_required("admin")
 def view_patient_history(patient_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     patient = Patient.query.get_or_404(patient_id)
-
-    appointments = (
-        Appointment.query
-        .filter_by(patient_id=patient.patient_id)
-        .outerjoin(Slot)
-        .outerjoin(Doctor)
-        .outerjoin(User, Doctor.user_id == User.user_id)
-        .outerjoin(Treatment)
-        .order_by(Appointment.created_at.desc())
-        .all()
-    )
+    appointments = paginate_patient_history(patient.patient_id)
+    audit_log.record("view_patient_history", "patient", patient_id)
 
     return render_template(
         "admin/patient_history.html",
@@ -381,86 +349,93 @@ def view_patient_history(patient_id):
     )
 
 
+@admin_bp.route("/search-treatments")
+@login_required("admin")
+def search_treatments_view():
+    q = request.args.get("q", "").strip()
+    results = search_treatments(q)
+    return render_template("admin/search_treatments.html", q=q, results=results)
+
+
 @admin_bp.route("/appointments")
+@login_required("admin")
 def view_appointments():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     query = request.args.get("q", "").strip()
-    search_by = request.args.get("search_by", "patient") 
-    base_query = (
-        Appointment.query
-        .outerjoin(Patient)
-        .outerjoin(Doctor)
-        .outerjoin(User, Doctor.user_id == User.user_id)
-        .outerjoin(Treatment)
-    )
+    search_by = request.args.get("search_by", "patient")
+    date_from = request.args.get("date_from", type=date.fromisoformat)
+    date_to = request.args.get("date_to", type=date.fromisoformat)
 
-    if query:
-        try:
-            patient_id_int = int(query)
-        except ValueError:
-            patient_id_int = None
-
-        if search_by == "patient":
-            appointments = base_query.filter(
-                or_(
-                    Patient.user.has(User.full_name.ilike(f"%{query}%")),
-                    Patient.patient_id == patient_id_int
-                )
-            ).order_by(Appointment.created_at.desc()).all()
-
-        elif search_by == "doctor":
-            appointments = base_query.filter(
-                or_(
-                    User.full_name.ilike(f"%{query}%"),
-                    Treatment.diagnosed_by.ilike(f"%{query}%")
-                )
-            ).order_by(Appointment.created_at.desc()).all()
-
-        elif search_by == "date":
-            appointments = base_query.filter(Slot.date.cast(db.String).ilike(f"%{query}%")).order_by(Appointment.created_at.desc()).all()
-
-        elif search_by == "time":
-            appointments = base_query.filter(Slot.time.cast(db.String).ilike(f"%{query}%")).order_by(Appointment.created_at.desc()).all()
-
-        elif search_by == "status":
-            appointments = base_query.filter(Appointment.status.ilike(f"%{query}%")).order_by(Appointment.created_at.desc()).all()
-    else:
-        appointments = base_query.order_by(Appointment.created_at.desc()).all()
+    if search_by == "time" and query and parse_hour_range(query) is None:
+        flash("Enter a time as HH or HH:MM (24-hr).", "error")
 
+    appointments = paginate_appointments(
+        filter_appointments(appointments_query(), query, search_by, date_from, date_to)
+    )
     return render_template("admin/view_appointments.html", appointments=appointments, query=query)
 
 
+def blacklist_and_notify(user_ids):
+    """Blacklists the users and emails every patient whose appointment was cancelled, in one batch."""
+    with email_batch():
+        summary, cancelled = blacklist_users(user_ids)
+        for row in cancelled:
+            send_appointment_status_email(
+                row.email,
+                row.full_name,
+                row.doctor_name or "N/A",
+                row.date,
+                row.time.strftime('%I:%M %p'),
+                "Cancelled"
+            )
+    return summary
+
+def blacklist_message(summary):
+    return (
+        f"{summary['users']} user(s) blacklisted, {summary['appointments_cancelled']} future appointment(s) cancelled, "
+        f"{summary['slots_freed']} slot(s) freed, "
+        f"{summary['patients_notified']} patient(s) notified."
+    )
+
+
 @admin_bp.route("/blacklist/<int:user_id>")
+@login_required("admin")
 def blacklist_user(user_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     user = User.query.get(user_id)
     if user:
-        user.status = "inactive"
-        db.session.commit()
-        flash(f"{user.full_name} has been blacklisted.", "success")
+        summary = blacklist_and_notify([user_id])
+        audit_log.record("blacklist", "user", user_id, **summary)
+        flash(f"{user.full_name} has been blacklisted. " + blacklist_message(summary), "success")
     else:
         flash("User not found.", "error")
     return redirect(request.referrer or url_for("mediconnect_admin.dashboard"))
 
+@admin_bp.route("/bulk-blacklist", methods=["POST"])
+@login_required("admin")
+def bulk_blacklist():
+    user_ids = sorted({int(u) for u in request.form.getlist("user_ids") if u.isdigit()})
+    if not user_ids:
+        flash("Select at least one user.", "error")
+        return redirect(request.referrer or url_for("mediconnect_admin.dashboard"))
+    if len(user_ids) > MAX_BULK_USERS:
+        flash(f"You can blacklist at most {MAX_BULK_USERS} users at once.", "error")
+        return redirect(request.referrer or url_for("mediconnect_admin.dashboard"))
+
+    summary = blacklist_and_notify(user_ids)
+    audit_log.record("bulk_blacklist", "user", None, user_ids=user_ids, **summary)
+    flash(blacklist_message(summary), "success")
+    return redirect(request.referrer or url_for("mediconnect_admin.dashboard"))
+
 @admin_bp.route("/unblacklist/<int:user_id>")
+@login_required("admin")
 def unblacklist_user(user_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     user = User.query.get(user_id)
     if user:
         user.status = "active"
         db.session.commit()
+        #the doctor's slots were kept while blacklisted and are bookable again
+        if user.doctor:
+            availability_cache.invalidate(user.doctor.doctor_id)
+        audit_log.record("unblacklist", "user", user_id)
         flash(f"{user.full_name} has been unblacklisted.", "success")
     else:
         flash("User not found.", "error")
@@ -468,12 +443,8 @@ def unblacklist_user(user_id):
 
 
 @admin_bp.route("/add-department", methods=["GET", "POST"])
+@login_required("admin")
 def add_department():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         description = request.form.get("description", "").strip()
@@ -491,6 +462,7 @@ def add_department():
             new_department = Department(name=name, description=description)
             db.session.add(new_department)
             db.session.commit()
+            audit_log.record("add_department", "department", new_department.department_id, name=name)
             flash("Department added successfully.", "success")
             return redirect(url_for("mediconnect_admin.view_departments"))
         except Exception as e:
@@ -502,12 +474,8 @@ def add_department():
 
 
 @admin_bp.route("/view-departments")
+@login_required("admin")
 def view_departments():
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     query = request.args.get("q", "").strip()
 
     if query:
@@ -521,17 +489,14 @@ def view_departments():
 
 
 @admin_bp.route("/delete-department/<int:department_id>", methods=["POST"])
+@login_required("admin")
 def delete_department(department_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     dept = Department.query.get_or_404(department_id)
 
     try:
         db.session.delete(dept)
         db.session.commit()
+        audit_log.record("delete_department", "department", department_id, name=dept.name)
         flash("Department removed successfully.", "success")
         return redirect(url_for("mediconnect_admin.view_departments"))
     except Exception as e:
@@ -541,12 +506,8 @@ def delete_department(department_id):
 
 
 @admin_bp.route("/edit-department/<int:department_id>", methods=["GET", "POST"])
+@login_required("admin")
 def edit_department(department_id):
-    admin_id = session.get("admin_id")
-    if not admin_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     department = Department.query.get_or_404(department_id)
     
     if request.method == "POST":
@@ -560,6 +521,7 @@ def edit_department(department_id):
             department.name = name
             department.description = description
             db.session.commit()
+            audit_log.record("edit_department", "department", department_id, name=name)
             flash("Department details updated successfully.", "success")
             return redirect(url_for("mediconnect_admin.view_departments"))
 
@@ -570,6 +532,27 @@ def edit_department(department_id):
 
     return render_template("admin/edit_department.html", department=department)
 
+@admin_bp.route("/audit-log")
+@login_required("admin")
+def audit_log_view():
+    action = request.args.get("action", "").strip()
+    actor_role = request.args.get("actor_role", "").strip()
+    target_type = request.args.get("target_type", "").strip()
+    target_id = request.args.get("target_id", type=int)
+
+    query = AuditEvent.query
+    if action:
+        query = query.filter(AuditEvent.action == action)
+    if actor_role:
+        query = query.filter(AuditEvent.actor_role == actor_role)
+    if target_type:
+        query = query.filter(AuditEvent.target_type == target_type)
+    if target_id is not None:
+        query = query.filter(AuditEvent.target_id == target_id)
+
+    events = paginate_audit_events(query)
+    return render_template("admin/audit_log.html", events=events, stats=audit_log.stats())
+
 @admin_bp.route("/logout")
 def logout():
     session.clear()
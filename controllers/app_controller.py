@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from models import db, Admin, User, Patient, Doctor, Department, PasswordResetOTP, VerificationOTP
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
-import random
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
+from models import db, Admin, User, Patient, Doctor, Department
+from datetime import datetime
+from password_utils import password_hasher, VerifierBusy
+from otp_utils import otp_store, OTP_ERRORS, VALID, INVALID
 from email_utils import send_welcome_email, send_otp_email, send_verification_email
+from pagination_utils import paginate_doctors
 import dns.resolver
 import re
 import pyotp
@@ -22,13 +23,13 @@ def home():
     doctors_query = Doctor.query.join(User).outerjoin(Department).filter(User.status == "active")
 
     if show_all:
-        doctors = doctors_query.all()
+        doctors = paginate_doctors(doctors_query)
     elif search_term:
         if search_by == "name":
             doctors_query = doctors_query.filter(User.full_name.ilike(f"%{search_term}%"))
         elif search_by == "department":
             doctors_query = doctors_query.filter(Department.name.ilike(f"%{search_term}%"))
-        doctors = doctors_query.all()
+        doctors = paginate_doctors(doctors_query)
     else:
         doctors = []
 
@@ -96,17 +97,8 @@ def register():
         # Store ALL form data (full_name, password, etc.) in session temporarily
         session['reg_data'] = request.form.to_dict()
         
-        # Generate OTP
-        otp = str(random.randint(100000, 999999))
-        expiry = datetime.now() + timedelta(minutes=10)
-        
-        # Clean old OTPs for this email if any
-        VerificationOTP.query.filter_by(email=email, purpose='register').delete()
-        
-        new_otp = VerificationOTP(email=email, otp=otp, purpose='register', expires_at=expiry)
-        db.session.add(new_otp)
-        db.session.commit()
-        
+        # Generate OTP, replacing any earlier one for this email
+        otp = otp_store.issue('register', email)
         send_verification_email(email, otp, "Patient Registration")
         return redirect(url_for('mediconnect.verify_registration'))
 
@@ -119,9 +111,23 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
-        # 1. Check Admin Login
-        admin = Admin.query.filter_by(email=email).first()
-        if admin and check_password_hash(admin.password, password):
+        try:
+            # 1. Check Admin Login
+            admin = Admin.query.filter_by(email=email).first()
+            admin_verified = admin is not None and password_hasher.verify(admin.password, password)
+            user = None if admin_verified else User.query.filter_by(email=email).first()
+            user_verified = user is not None and password_hasher.verify(user.password, password)
+        except VerifierBusy:
+            flash("Too many sign-ins right now. Please try again in a moment.", "danger")
+            return render_template('login.html')
+
+        #hashes made with older parameters are upgraded while the plain password is at hand
+        account = admin if admin_verified else user if user_verified else None
+        if account is not None and password_hasher.needs_rehash(account.password):
+            account.password = password_hasher.hash(password)
+            db.session.commit()
+
+        if admin_verified:
             session['temp_admin_id'] = admin.admin_id
             
             # CASE A: Admin has TOTP enabled
@@ -129,21 +135,13 @@ def login():
                 return redirect(url_for('mediconnect.verify_totp_login'))
             
             # CASE B: Admin uses default Email OTP
-            otp = str(random.randint(100000, 999999))
-            expiry = datetime.now() + timedelta(minutes=10)
-            VerificationOTP.query.filter_by(email=email, purpose='admin_login').delete()
-            
-            new_otp = VerificationOTP(email=email, otp=otp, purpose='admin_login', expires_at=expiry)
-            db.session.add(new_otp)
-            db.session.commit()
-            
+            otp = otp_store.issue('admin_login', admin.email)
             send_verification_email(email, otp, "Admin Login")
             flash("Admin credentials verified. Please enter OTP.", "info")
             return redirect(url_for('mediconnect.verify_admin_login'))
 
         # 2. Check User Login
-        user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password, password):
+        if not user_verified:
             flash("Invalid email or password", "danger")
             return render_template('login.html')
 
@@ -214,14 +212,7 @@ def switch_to_email_otp():
     admin = Admin.query.get(session['temp_admin_id'])
     
     # Generate Email OTP logic (same as standard admin login)
-    otp = str(random.randint(100000, 999999))
-    expiry = datetime.now() + timedelta(minutes=10)
-    VerificationOTP.query.filter_by(email=admin.email, purpose='admin_login').delete()
-    
-    new_otp = VerificationOTP(email=admin.email, purpose='admin_login', otp=otp, expires_at=expiry)
-    db.session.add(new_otp)
-    db.session.commit()
-    
+    otp = otp_store.issue('admin_login', admin.email)
     send_verification_email(admin.email, otp, "Admin Login (Fallback)")
     flash("OTP sent to email. Please verify.", "info")
     return redirect(url_for('mediconnect.verify_admin_login'))
@@ -240,16 +231,7 @@ def switch_to_user_email_otp():
         return redirect(url_for('mediconnect.login'))
     
     # Generate Email OTP for User Fallback
-    otp = str(random.randint(100000, 999999))
-    expiry = datetime.now() + timedelta(minutes=10)
-    purpose = 'user_totp_fallback'
-    
-    VerificationOTP.query.filter_by(email=user.email, purpose=purpose).delete()
-    
-    new_otp = VerificationOTP(email=user.email, purpose=purpose, otp=otp, expires_at=expiry)
-    db.session.add(new_otp)
-    db.session.commit()
-    
+    otp = otp_store.issue('user_totp_fallback', user.email)
     send_verification_email(user.email, otp, "2FA Fallback Verification")
     flash("OTP sent to your registered email. Please verify.", "info")
     
@@ -268,15 +250,11 @@ def verify_user_fallback_otp():
         return redirect(url_for('mediconnect.login'))
 
     if request.method == 'POST':
-        otp_input = request.form.get('otp')
-        purpose = 'user_totp_fallback'
+        result = otp_store.verify('user_totp_fallback', user.email, request.form.get('otp'))
         
-        record = VerificationOTP.query.filter_by(email=user.email, purpose=purpose).order_by(VerificationOTP.id.desc()).first()
-        
-        if record and record.otp == otp_input and record.expires_at > datetime.now():
+        if result == VALID:
             # Success! Finalize Login
-            VerificationOTP.query.filter_by(email=user.email, purpose=purpose).delete()
-            db.session.commit()
+            otp_store.consume('user_totp_fallback', user.email)
             
             session.pop('temp_user_id', None)
             session["user_id"] = user.user_id
@@ -288,7 +266,7 @@ def verify_user_fallback_otp():
                 return redirect(url_for("mediconnect_doctor.dashboard"))
             return redirect(url_for("mediconnect_patient.dashboard"))
         else:
-            flash("Invalid or expired OTP.", "error")
+            flash(OTP_ERRORS[result], "error")
 
     # Reuse generic verify template
     return render_template('verify_action.html', 
@@ -299,11 +277,8 @@ def verify_user_fallback_otp():
 @app_bp.route('/setup-2fa', methods=['GET', 'POST'])
 def setup_2fa():
     # Identify current logged in user
-    if 'admin_id' in session:
-        user = Admin.query.get(session['admin_id'])
-    elif 'user_id' in session:
-        user = User.query.get(session['user_id'])
-    else:
+    user = g.admin or g.user
+    if user is None:
         return redirect(url_for('mediconnect.login'))
 
     if request.method == 'POST':
@@ -347,11 +322,11 @@ def setup_2fa():
 
 @app_bp.route('/disable-2fa', methods=['POST'])
 def disable_2fa():
-    if 'admin_id' in session:
-        user = Admin.query.get(session['admin_id'])
+    if g.admin:
+        user = g.admin
         back_url = url_for('mediconnect_admin.profile')
-    elif 'user_id' in session:
-        user = User.query.get(session['user_id'])
+    elif g.user:
+        user = g.user
         if user.role == 'doctor':
             back_url = url_for('mediconnect_doctor.profile')
         else:
@@ -380,20 +355,17 @@ def verify_admin_login():
             flash("Session Error. Please login again.", "error")
             return redirect(url_for('mediconnect.login'))
 
-        record = VerificationOTP.query.filter_by(email=admin.email, purpose='admin_login').order_by(VerificationOTP.id.desc()).first()
+        result = otp_store.verify('admin_login', admin.email, otp_input)
         
-        if record and record.otp == otp_input and record.expires_at > datetime.now():
+        if result == VALID:
             # Success
             session.pop('temp_admin_id', None)
             session["admin_id"] = admin.admin_id
-            
-            # Cleanup
-            VerificationOTP.query.filter_by(email=admin.email, purpose='admin_login').delete()
-            db.session.commit()
+            otp_store.consume('admin_login', admin.email)
             
             return redirect(url_for('mediconnect_admin.dashboard'))
         else:
-            flash("Invalid or expired OTP", "error")
+            flash(OTP_ERRORS[result], "error")
             
     return render_template('verify_action.html', title="Admin 2FA", action_url=url_for('mediconnect.verify_admin_login'))
 
@@ -406,10 +378,9 @@ def verify_registration():
     email = session['reg_data']['email']
     
     if request.method == 'POST':
-        otp_input = request.form.get('otp')
-        record = VerificationOTP.query.filter_by(email=email, purpose='register').order_by(VerificationOTP.id.desc()).first()
+        result = otp_store.verify('register', email, request.form.get('otp'))
         
-        if record and record.otp == otp_input and record.expires_at > datetime.now():
+        if result == VALID:
             # Success - Create User Now
             data = session['reg_data']
             
@@ -417,7 +388,7 @@ def verify_registration():
                 new_user = User(
                     full_name=data['full_name'],
                     email=data['email'],
-                    password=generate_password_hash(data['password']),
+                    password=password_hasher.hash(data['password']),
                     role='patient',
                     phone_no=data['phone_no'],
                     status='active'
@@ -434,10 +405,8 @@ def verify_registration():
                     emergency_contact=data['emergency_contact']
                 )
                 db.session.add(patient)
-                
-                # Cleanup
-                VerificationOTP.query.filter_by(email=email, purpose='register').delete()
                 db.session.commit()
+                otp_store.consume('register', email)
                 
                 session.pop('reg_data', None)
                 send_welcome_email(data['full_name'], data['email'])
@@ -449,7 +418,7 @@ def verify_registration():
                 flash("An error occurred during account creation.", "error")
                 return redirect(url_for('mediconnect.register'))
         else:
-            flash("Invalid or expired OTP", "error")
+            flash(OTP_ERRORS[result], "error")
 
     return render_template('verify_action.html', title="Verify Registration", action_url=url_for('mediconnect.verify_registration'))
 
@@ -464,17 +433,8 @@ def reset_password():
             flash("No account found with this email.", "error")
             return redirect(url_for("mediconnect.reset_password"))
 
-        # Generate OTP
-        otp = str(random.randint(100000, 999999))
-        expiry = datetime.now() + timedelta(minutes=10)
-
-        # Remove previous OTPs
-        PasswordResetOTP.query.filter_by(user_id=user.user_id).delete()
-
-        # Save new OTP
-        new_otp = PasswordResetOTP(user_id=user.user_id, otp=otp, expires_at=expiry)
-        db.session.add(new_otp)
-        db.session.commit()
+        # Generate OTP, replacing any earlier one
+        otp = otp_store.issue('password_reset', user.user_id)
         send_otp_email(email, otp)
 
         session['reset_user_id'] = user.user_id
@@ -495,16 +455,15 @@ def verify_otp():
         return redirect(url_for("mediconnect.reset_password"))
 
     if request.method == "POST":
-        otp_input = request.form.get("otp")
-        saved = PasswordResetOTP.query.filter_by(user_id=user_id).first()
+        result = otp_store.verify('password_reset', user_id, request.form.get("otp"))
 
-        if not saved or saved.expires_at < datetime.now():
-            flash("OTP expired or invalid.", "error")
-            return redirect(url_for("mediconnect.reset_password"))
-
-        if saved.otp != otp_input:
-            flash("Incorrect OTP.", "error")
+        if result == INVALID:
+            flash(OTP_ERRORS[result], "error")
             return redirect(url_for("mediconnect.verify_otp"))
+
+        if result != VALID:
+            flash(OTP_ERRORS[result], "error")
+            return redirect(url_for("mediconnect.reset_password"))
     
         # 2. OTP is correct -> Set verified flag in session
         session['reset_verified'] = True
@@ -534,11 +493,9 @@ def reset_password_new():
             flash("Passwords do not match.", "error")
             return redirect(url_for("mediconnect.reset_password_new"))
 
-        user.password = generate_password_hash(password)
-        
-        # Clear OTPs from DB
-        PasswordResetOTP.query.filter_by(user_id=user_id).delete()
+        user.password = password_hasher.hash(password)
         db.session.commit()
+        otp_store.consume('password_reset', user_id)
 
         # 2. CLEAN UP SESSION (Critical)
         session.pop('reset_user_id', None)
@@ -1,66 +1,80 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from models import db, Doctor, Patient, User, Appointment, Slot, Treatment, VerificationOTP
-from datetime import datetime, timedelta
-from sqlalchemy import or_
-from werkzeug.security import generate_password_hash
-from email_utils import send_appointment_status_email, send_verification_email
-import random
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
+from models import db, Patient, User, Appointment, Slot, Treatment, AvailabilityRule, AvailabilityException
+from datetime import datetime
+from sqlalchemy import or_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from password_utils import password_hasher
+from email_utils import send_appointment_status_email, send_verification_email, email_batch
+from availability_utils import availability_cache
+from booking_utils import bulk_clone_slots, bulk_update_appointments, MAX_BULK_APPOINTMENTS
+from history_utils import paginate_patient_history, recent_visits
+from search_utils import search_treatments
+from audit_utils import audit_log
+from otp_utils import otp_store, OTP_ERRORS, VALID
+from auth_utils import login_required
 
 doctor_bp = Blueprint("mediconnect_doctor", __name__, url_prefix="/doctor")
 
 @doctor_bp.route("/dashboard")
+@login_required("doctor")
 def dashboard():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    if not doctor:
-        flash("Doctor profile not found.", "error")
-        return redirect(url_for("mediconnect.login"))
-
+    doctor = g.doctor
     doctor_id = doctor.doctor_id
 
     search_term = request.args.get("search", "")
     search_by = request.args.get("search_by", "patient")
 
-    appointments = Appointment.query.outerjoin(Slot).join(Patient).join(User).filter(Appointment.doctor_id == doctor_id).order_by(Slot.date, Slot.time).all()
+    #the table is the only row-level fetch; patient.user and slot come from its joins
+    appointments_query = (
+        Appointment.query
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .filter(Appointment.doctor_id == doctor_id)
+        .options(
+            contains_eager(Appointment.slot),
+            contains_eager(Appointment.patient).contains_eager(Patient.user)
+        )
+    )
 
-    filtered_appointments = appointments
     if search_term:
-        filtered_appointments = (
-            Appointment.query.outerjoin(Slot)
-            .outerjoin(Treatment)
-            .outerjoin(Patient, Appointment.patient_id == Patient.patient_id)
-            .outerjoin(User, Patient.user)
-            .filter(
-                Appointment.doctor_id == doctor_id,
-                or_(
-                    User.full_name.ilike(f"%{search_term}%") if search_by == "patient" else False,
-                    Slot.date.cast(db.String).ilike(f"%{search_term}%") if search_by == "date" else False,
-                    Slot.time.cast(db.String).ilike(f"%{search_term}%") if search_by == "time" else False,
-                    Appointment.status.ilike(f"%{search_term}%") if search_by == "status" else False
-                )
+        appointments_query = appointments_query.filter(
+            or_(
+                User.full_name.ilike(f"%{search_term}%") if search_by == "patient" else False,
+                Slot.date.cast(db.String).ilike(f"%{search_term}%") if search_by == "date" else False,
+                Slot.time.cast(db.String).ilike(f"%{search_term}%") if search_by == "time" else False,
+                Appointment.status.ilike(f"%{search_term}%") if search_by == "status" else False
             )
-            .order_by(Slot.date, Slot.time)
-            .all()
         )
 
-    total_appointments = len(appointments)
-    booked_appointments = sum(1 for a in appointments if a.status == 'Booked')
-    cancelled_appointments = sum(1 for a in appointments if a.status == 'Cancelled')
-    completed_appointments = sum(1 for a in appointments if a.status == 'Completed')
+    filtered_appointments = appointments_query.order_by(Slot.date, Slot.time).all()
 
-    #line chart
+    #counts and the per-day series from one aggregate over (date, status)
+    status_by_date = (
+        db.session.query(Slot.date, Appointment.status, func.count(Appointment.appointment_id))
+        .select_from(Appointment)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .filter(Appointment.doctor_id == doctor_id)
+        .group_by(Slot.date, Appointment.status)
+        .all()
+    )
+
+    status_counts = {}
     date_counts = {}
-    for appt in appointments:
-        if appt.slot and appt.slot.date:
-            date_str = appt.slot.date.isoformat()
-            date_counts[date_str] = date_counts.get(date_str, 0) + 1
-    
+    for day, status, count in status_by_date:
+        status_counts[status] = status_counts.get(status, 0) + count
+        if day:
+            date_counts[day] = date_counts.get(day, 0) + count
+
+    total_appointments = sum(status_counts.values())
+    booked_appointments = status_counts.get('Booked', 0)
+    cancelled_appointments = status_counts.get('Cancelled', 0)
+    completed_appointments = status_counts.get('Completed', 0)
+
+    #line chart
     sorted_items = sorted(date_counts.items())
-    chart_dates = [item[0] for item in sorted_items]
+    chart_dates = [item[0].isoformat() for item in sorted_items]
     chart_counts = [item[1] for item in sorted_items]
 
     department_name = doctor.department.name if doctor.department else "Not Assigned"
@@ -81,16 +95,9 @@ def dashboard():
 
 
 @doctor_bp.route("/profile", methods=["GET", "POST"])
+@login_required("doctor")
 def profile():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    if not doctor:
-        flash("Doctor record not found.", "error")
-        return redirect(url_for("mediconnect_doctor.dashboard"))
+    doctor = g.doctor
 
     if request.method == "POST":
         # Get form data
@@ -110,17 +117,8 @@ def profile():
             # Store all update data in session
             session['doctor_update_data'] = request.form.to_dict()
 
-            # Generate and Send OTP
-            otp = str(random.randint(100000, 999999))
-            expiry = datetime.now() + timedelta(minutes=10)
-
-            # Cleanup old OTPs
-            VerificationOTP.query.filter_by(email=new_email, purpose='doc_email_update').delete()
-
-            new_otp = VerificationOTP(email=new_email, otp=otp, purpose='doc_email_update', expires_at=expiry)
-            db.session.add(new_otp)
-            db.session.commit()
-
+            # Generate and Send OTP, replacing any earlier one
+            otp = otp_store.issue('doc_email_update', new_email)
             send_verification_email(new_email, otp, "Email Change Verification")
             return redirect(url_for('mediconnect_doctor.verify_email_update'))
 
@@ -128,7 +126,7 @@ def profile():
         if phone_no:
             doctor.user.phone_no = phone_no
         if password:
-            doctor.user.password = generate_password_hash(password)
+            doctor.user.password = password_hasher.hash(password)
         if qualification:
             doctor.qualification = qualification
         if experience_years.isdigit():
@@ -142,53 +140,47 @@ def profile():
 
 
 @doctor_bp.route("/verify-email-update", methods=["GET", "POST"])
+@login_required("doctor")
 def verify_email_update():
-    user_id = session.get("user_id")
-    if not user_id or 'doctor_update_data' not in session:
+    if 'doctor_update_data' not in session:
         return redirect(url_for("mediconnect_doctor.dashboard"))
 
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor = g.doctor
     data = session['doctor_update_data']
     new_email = data['email']
 
     if request.method == 'POST':
-        otp_input = request.form.get('otp')
-        record = VerificationOTP.query.filter_by(email=new_email, purpose='doc_email_update').order_by(VerificationOTP.id.desc()).first()
+        result = otp_store.verify('doc_email_update', new_email, request.form.get('otp'))
 
-        if record and record.otp == otp_input and record.expires_at > datetime.now():
+        if result == VALID:
             # --- Apply Updates ---
             doctor.user.email = new_email
             
             if data.get('phone_no'):
                 doctor.user.phone_no = data['phone_no']
             if data.get('password'):
-                doctor.user.password = generate_password_hash(data['password'])
+                doctor.user.password = password_hasher.hash(data['password'])
             if data.get('qualification'):
                 doctor.qualification = data['qualification']
             if data.get('experience_years') and data['experience_years'].isdigit():
                 doctor.experience_years = int(data['experience_years'])
 
-            # Cleanup
-            VerificationOTP.query.filter_by(email=new_email, purpose='doc_email_update').delete()
             db.session.commit()
+            otp_store.consume('doc_email_update', new_email)
             session.pop('doctor_update_data', None)
 
             flash("Profile and Email updated successfully.", "success")
             return redirect(url_for("mediconnect_doctor.profile"))
         else:
-            flash("Invalid or expired OTP", "error")
+            flash(OTP_ERRORS[result], "error")
 
     # Reuse the generic verify template
     return render_template('verify_action.html', title="Verify Email Update", action_url=url_for('mediconnect_doctor.verify_email_update'))
 
 
 @doctor_bp.route("/update_appointment/<int:appointment_id>", methods=["POST"])
+@login_required("doctor")
 def update_appointment(appointment_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     appointment = Appointment.query.get_or_404(appointment_id)
     new_status = request.form.get("status")
 
@@ -201,8 +193,6 @@ def update_appointment(appointment_id):
         flash("Invalid status update.", "danger") #validation
         return redirect(url_for("mediconnect_doctor.dashboard"))
 
-    appointment.status = new_status
-    
     if new_status in ["Completed", "Cancelled"]:
         appt_date = appointment.slot.date if appointment.slot else 'N/A'
         appt_time = appointment.slot.time.strftime('%I:%M %p') if appointment.slot else 'N/A'
@@ -216,27 +206,79 @@ def update_appointment(appointment_id):
             new_status
         )
 
+    #status changes come after the lazy loads above so autoflush can't write a half-cancelled row
+    appointment.status = new_status
+    freed_slot = None
     if new_status == "Cancelled" and appointment.slot:
-        appointment.slot.status = "Available"
-        appointment.slot_id = None
+        freed_slot = appointment.slot
+        freed_slot.status = "Available"
+        appointment.slot = None
 
     if new_status == "Completed" and appointment.slot:
         appointment.slot.status = "Booked"
 
     db.session.commit()
+    audit_log.record("update_appointment", "appointment", appointment_id, status=new_status)
+
+    if freed_slot:
+        availability_cache.add(freed_slot.doctor_id, freed_slot.date, freed_slot.time, freed_slot.slot_id)
     flash(f"Appointment marked as {new_status}.", "success")
     return redirect(url_for("mediconnect_doctor.dashboard"))
 
 
+@doctor_bp.route("/bulk-update-appointments", methods=["POST"])
+@login_required("doctor")
+def bulk_update_appointments_view():
+    doctor = g.doctor
+
+    new_status = request.form.get("status")
+    if new_status not in ["Completed", "Cancelled"]:
+        flash("Invalid status update.", "danger")
+        return redirect(url_for("mediconnect_doctor.dashboard"))
+
+    appointment_ids = {int(a) for a in request.form.getlist("appointment_ids") if a.isdigit()}
+    if not appointment_ids:
+        flash("Select at least one appointment.", "error")
+        return redirect(url_for("mediconnect_doctor.dashboard"))
+    if len(appointment_ids) > MAX_BULK_APPOINTMENTS:
+        flash(f"You can update at most {MAX_BULK_APPOINTMENTS} appointments at once.", "error")
+        return redirect(url_for("mediconnect_doctor.dashboard"))
+
+    with email_batch():
+        updated = bulk_update_appointments(doctor.doctor_id, appointment_ids, new_status)
+        audit_log.record("bulk_update_appointments", "appointment", None, status=new_status, appointment_ids=[row.appointment_id for row in updated])
+        for row in updated:
+            send_appointment_status_email(
+                row.email,
+                row.full_name,
+                doctor.user.full_name,
+                row.date if row.date else 'N/A',
+                row.time.strftime('%I:%M %p') if row.time else 'N/A',
+                new_status
+            )
+
+    skipped = len(appointment_ids) - len(updated)
+    message = f"{len(updated)} appointment(s) marked as {new_status}."
+    if skipped:
+        message += f" {skipped} skipped (not booked with you or patient unavailable)."
+    flash(message, "success" if updated else "warning")
+    return redirect(url_for("mediconnect_doctor.dashboard"))
+
+
 @doctor_bp.route("/treatment/<int:appointment_id>", methods=["GET", "POST"])
+@login_required("doctor")
 def treatment(appointment_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    appointment = Appointment.query.get_or_404(appointment_id)
+    doctor = g.doctor
+    appointment = (
+        Appointment.query
+        .options(
+            joinedload(Appointment.slot),
+            joinedload(Appointment.patient).joinedload(Patient.user),
+            joinedload(Appointment.treatment)
+        )
+        .filter_by(appointment_id=appointment_id)
+        .first_or_404()
+    )
     if appointment.slot.doctor_id != doctor.doctor_id:
         flash("Not authorized", "error") #validation
         return redirect(url_for("mediconnect_doctor.dashboard"))
@@ -260,6 +302,7 @@ def treatment(appointment_id):
         treatment.notes = notes
         appointment.status = "Completed"
         db.session.commit()
+        audit_log.record("save_treatment", "appointment", appointment_id, treatment_id=treatment.treatment_id)
 
         appt_date = appointment.slot.date if appointment.slot else 'N/A'
         appt_time = appointment.slot.time.strftime('%I:%M %p') if appointment.slot else 'N/A'
@@ -276,52 +319,52 @@ def treatment(appointment_id):
         flash("Treatment saved successfully", "success")
         return redirect(url_for("mediconnect_doctor.dashboard"))
 
-    return render_template("doctor/treatment.html", appointment=appointment)
+    previous_visits = recent_visits(appointment.patient_id, exclude_appointment_id=appointment.appointment_id)
+    return render_template("doctor/treatment.html", appointment=appointment, previous_visits=previous_visits)
 
 
 @doctor_bp.route("/patient-history/<int:patient_id>")
+@login_required("doctor")
 def patient_history(patient_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    patient = Patient.query.get_or_404(patient_id)
-    appointments = Appointment.query.filter_by(patient_id=patient.patient_id).all()
+    patient = Patient.query.options(joinedload(Patient.user)).filter_by(patient_id=patient_id).first_or_404()
+    appointments = paginate_patient_history(patient.patient_id)
+    audit_log.record("view_patient_history", "patient", patient_id)
     return render_template("doctor/patient_history.html",
                            patient=patient,
                            appointments=appointments)
 
 
+@doctor_bp.route("/search-treatments")
+@login_required("doctor")
+def search_treatments_view():
+    doctor = g.doctor
+
+    q = request.args.get("q", "").strip()
+    results = search_treatments(q, doctor_id=doctor.doctor_id)
+    return render_template("doctor/search_treatments.html", q=q, results=results)
+
+
 @doctor_bp.route("/slots")
+@login_required("doctor")
 def slots():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    slots = Slot.query.filter_by(doctor_id=doctor.doctor_id).order_by(Slot.date, Slot.time).all()
-    for slot in slots:
-        if slot.appointment:
-            if slot.appointment.status in ["Completed", "Booked"]:
-                slot.status = "Booked"
-            elif slot.appointment.status == "Cancelled":
-                slot.status = "Available"
-        else:
-            slot.status = "Available"
-    db.session.commit()
+    doctor = g.doctor
+
+    #slot status is kept in step by the booking and cancel paths, so this page only reads
+    slots = (
+        Slot.query
+        .outerjoin(Appointment, Appointment.slot_id == Slot.slot_id)
+        .filter(Slot.doctor_id == doctor.doctor_id, Slot.date >= datetime.now().date())
+        .options(contains_eager(Slot.appointment))
+        .order_by(Slot.date, Slot.time)
+        .all()
+    )
     return render_template("doctor/slots.html", doctor=doctor, slots=slots)
 
 
 @doctor_bp.route("/add-slot", methods=["GET", "POST"])
+@login_required("doctor")
 def add_slot():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor = g.doctor
 
     if request.method == "POST":
         date_str = request.form.get("date")
@@ -341,7 +384,14 @@ def add_slot():
             status="Available"
         )
         db.session.add(new_slot)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash("A slot already exists at that date and time.", "error")
+            return redirect(url_for("mediconnect_doctor.add_slot"))
+
+        availability_cache.add(doctor.doctor_id, new_slot.date, new_slot.time, new_slot.slot_id)
         flash("Slot added successfully.", "success")
         return redirect(url_for("mediconnect_doctor.slots"))
 
@@ -349,12 +399,8 @@ def add_slot():
 
 
 @doctor_bp.route("/edit-slot/<int:slot_id>", methods=["GET", "POST"])
+@login_required("doctor")
 def edit_slot(slot_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     slot = Slot.query.get_or_404(slot_id)
     
     if slot.appointment and slot.appointment.status != "Cancelled":
@@ -366,20 +412,25 @@ def edit_slot(slot_id):
         time = request.form.get("time")
         slot.date = datetime.strptime(date, "%Y-%m-%d").date()
         slot.time = datetime.strptime(time, "%H:%M").time()
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash("A slot already exists at that date and time.", "error")
+            return redirect(url_for("mediconnect_doctor.edit_slot", slot_id=slot_id))
+
+        availability_cache.discard(slot.doctor_id, slot.slot_id)
+        if slot.status == "Available":
+            availability_cache.add(slot.doctor_id, slot.date, slot.time, slot.slot_id)
         flash("Slot updated", "success")
         return redirect(url_for("mediconnect_doctor.slots"))
 
     return render_template("doctor/edit_slot.html", slot=slot)
 
 @doctor_bp.route("/clone-slots", methods=["GET", "POST"])
+@login_required("doctor")
 def clone_slots():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor = g.doctor
 
     if request.method == "POST":
         source_date_str = request.form.get("source_date")
@@ -394,56 +445,132 @@ def clone_slots():
             flash("Start date cannot be after end date.", "error")
             return redirect(url_for("mediconnect_doctor.clone_slots"))
 
-        original_slots = Slot.query.filter_by(doctor_id=doctor.doctor_id, date=source_date).all()
+        #slots that already exist are skipped by the database
+        result = bulk_clone_slots(doctor.doctor_id, source_date, start_date, end_date)
 
-        if not original_slots:
+        if result is None:
             flash(f"No slots found for {source_date}.", "error")
             return redirect(url_for("mediconnect_doctor.slots"))
 
-        current_date = start_date
-        while current_date <= end_date:
-            for slot in original_slots:
-                #skips if already present
-                exists = Slot.query.filter_by(
-                    doctor_id=doctor.doctor_id,
-                    date=current_date,
-                    time=slot.time
-                ).first()
-                if not exists:
-                    new_slot = Slot(
-                        doctor_id=doctor.doctor_id,
-                        date=current_date,
-                        time=slot.time,
-                        status="Available"
-                    )
-                    db.session.add(new_slot)
-            current_date += timedelta(days=1)
-
-        db.session.commit()
-        flash(f"Slots cloned successfully from {source_date} to the range {start_date} – {end_date}.", "success")
+        created, skipped = result
+        flash(f"Slots cloned successfully from {source_date} to the range {start_date} – {end_date}: {created} created, {skipped} skipped.", "success")
         return redirect(url_for("mediconnect_doctor.slots"))
 
     return render_template("doctor/clone_slots.html", doctor=doctor)
 
 @doctor_bp.route("/delete-slot/<int:slot_id>", methods=["POST"])
+@login_required("doctor")
 def delete_slot(slot_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-    
     slot = Slot.query.get_or_404(slot_id)
 
     if slot.appointment and slot.appointment.status != "Cancelled":
         flash("Cannot delete a booked slot", "error") #validation
         return redirect(url_for("mediconnect_doctor.slots"))
 
+    doctor_id = slot.doctor_id
     db.session.delete(slot)
     db.session.commit()
+    availability_cache.discard(doctor_id, slot_id)
     flash("Slot deleted successfully.", "success")
     return redirect(url_for("mediconnect_doctor.slots"))
 
 
+@doctor_bp.route("/availability-rules", methods=["GET", "POST"])
+@login_required("doctor")
+def availability_rules():
+    doctor = g.doctor
+
+    if request.method == "POST":
+        weekday = request.form.get("weekday", type=int)
+        start_str = request.form.get("start_time")
+        end_str = request.form.get("end_time")
+        interval = request.form.get("interval_minutes", 30, type=int)
+        valid_from_str = request.form.get("valid_from")
+        valid_until_str = request.form.get("valid_until")
+
+        if weekday not in range(7) or not start_str or not end_str or not valid_from_str:
+            flash("Weekday, start time, end time and start date are required.", "error") #validation
+            return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+        start_time = datetime.strptime(start_str, "%H:%M").time()
+        end_time = datetime.strptime(end_str, "%H:%M").time()
+        valid_from = datetime.strptime(valid_from_str, "%Y-%m-%d").date()
+        valid_until = datetime.strptime(valid_until_str, "%Y-%m-%d").date() if valid_until_str else None
+
+        if end_time <= start_time or not 5 <= interval <= 240:
+            flash("End time must be after start time and the interval between 5 and 240 minutes.", "error")
+            return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+        if valid_until and valid_until < valid_from:
+            flash("Start date cannot be after end date.", "error")
+            return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+        rule = AvailabilityRule(
+            doctor_id=doctor.doctor_id,
+            weekday=weekday,
+            start_time=start_time,
+            end_time=end_time,
+            interval_minutes=interval,
+            valid_from=valid_from,
+            valid_until=valid_until
+        )
+        db.session.add(rule)
+        db.session.commit()
+        availability_cache.invalidate(doctor.doctor_id)
+        flash("Recurring availability added.", "success")
+        return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+    rules = (
+        AvailabilityRule.query
+        .options(selectinload(AvailabilityRule.exceptions))
+        .filter_by(doctor_id=doctor.doctor_id)
+        .order_by(AvailabilityRule.weekday, AvailabilityRule.start_time)
+        .all()
+    )
+    return render_template("doctor/availability_rules.html", doctor=doctor, rules=rules)
+
+
+@doctor_bp.route("/add-rule-exception/<int:rule_id>", methods=["POST"])
+@login_required("doctor")
+def add_rule_exception(rule_id):
+    doctor = g.doctor
+    rule = AvailabilityRule.query.get_or_404(rule_id)
+    if rule.doctor_id != doctor.doctor_id:
+        flash("Not authorized", "error") #validation
+        return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+    date_str = request.form.get("date")
+    if not date_str:
+        flash("Date is required.", "error")
+        return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+    skip_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    if not any(e.date == skip_date for e in rule.exceptions):
+        db.session.add(AvailabilityException(rule_id=rule.rule_id, date=skip_date))
+        db.session.commit()
+        availability_cache.invalidate(doctor.doctor_id)
+
+    flash(f"Recurring slots skipped on {skip_date}. Slots already booked that day are kept.", "success")
+    return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+
+@doctor_bp.route("/delete-rule/<int:rule_id>", methods=["POST"])
+@login_required("doctor")
+def delete_rule(rule_id):
+    doctor = g.doctor
+    rule = AvailabilityRule.query.get_or_404(rule_id)
+    if rule.doctor_id != doctor.doctor_id:
+        flash("Not authorized", "error") #validation
+        return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+    #slots already materialized from this rule stay, including booked ones
+    db.session.delete(rule)
+    db.session.commit()
+    availability_cache.invalidate(doctor.doctor_id)
+    flash("Recurring availability removed.", "success")
+    return redirect(url_for("mediconnect_doctor.availability_rules"))
+
+
 @doctor_bp.route("/logout")
 def logout():
     session.clear()
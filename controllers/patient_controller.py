@@ -1,24 +1,23 @@
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash
-from models import db, Patient, Appointment, Department, Slot, Doctor, Treatment, User, VerificationOTP
-from sqlalchemy import or_
-from datetime import datetime, timedelta
-import random
-from werkzeug.security import generate_password_hash
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, g
+from models import db, Appointment, Department, Slot, Doctor, Treatment, User
+from sqlalchemy import or_, func
+from sqlalchemy.orm import contains_eager, joinedload
+from datetime import datetime, date, time
+from password_utils import password_hasher
 from email_utils import send_appointment_booking_email, send_appointment_cancellation_email, send_appointment_reschedule_email, send_verification_email
+from booking_utils import book_slot, swap_slot, resolve_slot, release_user_slots
+from availability_utils import availability_cache
+from pagination_utils import paginate_doctors, decode_cursor, get_page_size, SLOT_PAGE_SIZE
+from audit_utils import audit_log
+from otp_utils import otp_store, OTP_ERRORS, VALID
+from auth_utils import login_required
 
 patient_bp = Blueprint("mediconnect_patient", __name__, url_prefix="/patient")
 
 @patient_bp.route("/dashboard")
+@login_required("patient")
 def dashboard():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    patient = Patient.query.filter_by(user_id=user_id).first()
-    if not patient:
-        flash("Patient profile not found.", "error")
-        return redirect(url_for("mediconnect.login"))
+    patient = g.patient
 
     search_term = request.args.get("search", "").strip()
     search_by = request.args.get("search_by", "doctor")
@@ -45,25 +44,39 @@ def dashboard():
         elif search_by == "status":
             query = query.filter(Appointment.status.ilike(f"%{search_term}%"))
 
-    appointments = query.order_by(Slot.date, Slot.time).all()
+    #table rows, with the relations the template reads filled from the joins above
+    appointments = (
+        query.options(
+            contains_eager(Appointment.slot),
+            contains_eager(Appointment.doctor).contains_eager(Doctor.user),
+            contains_eager(Appointment.treatment)
+        )
+        .order_by(Slot.date, Slot.time)
+        .all()
+    )
 
     upcoming = [a for a in appointments if a.status == "Booked"]
     past = [a for a in appointments if a.status in ["Completed", "Cancelled"]]
 
     #pie chart
-    chart_completed = sum(1 for a in past if a.status == 'Completed')
-    chart_cancelled = sum(1 for a in past if a.status == 'Cancelled')
+    status_counts = dict(
+        query.with_entities(Appointment.status, func.count(Appointment.appointment_id))
+        .group_by(Appointment.status)
+        .all()
+    )
+    chart_completed = status_counts.get('Completed', 0)
+    chart_cancelled = status_counts.get('Cancelled', 0)
 
     #line chart
-    date_counts = {}
-    for appt in past:
-        if appt.slot and appt.slot.date:
-            date_str = appt.slot.date.isoformat()
-            date_counts[date_str] = date_counts.get(date_str, 0) + 1
-    
-    sorted_items = sorted(date_counts.items())
-    chart_dates = [item[0] for item in sorted_items]
-    chart_counts = [item[1] for item in sorted_items]
+    date_counts = (
+        query.filter(Appointment.status.in_(["Completed", "Cancelled"]), Slot.date.isnot(None))
+        .with_entities(Slot.date, func.count(Appointment.appointment_id))
+        .group_by(Slot.date)
+        .order_by(Slot.date)
+        .all()
+    )
+    chart_dates = [day.isoformat() for day, _ in date_counts]
+    chart_counts = [count for _, count in date_counts]
 
     return render_template(
         "patient/dashboard.html",
@@ -79,16 +92,9 @@ def dashboard():
 
 
 @patient_bp.route("/profile", methods=["GET", "POST"])
+@login_required("patient")
 def profile():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    patient = Patient.query.filter_by(user_id=user_id).first()
-    if not patient:
-        flash("Patient record not found.", "error")
-        return redirect(url_for("mediconnect_patient.dashboard"))
+    patient = g.patient
 
     if request.method == "POST":
         full_name = request.form.get("full_name").strip() #updating user info
@@ -96,7 +102,7 @@ def profile():
         password = request.form.get("password").strip()
         phone_no = request.form.get("phone_no").strip()
 
-        if User.query.filter(User.email == email, User.user_id != user_id).first():
+        if User.query.filter(User.email == email, User.user_id != patient.user_id).first():
             #preventing duplicate user email
             flash("Email already exists.", "error")
             return redirect(url_for("mediconnect_patient.profile"))
@@ -116,19 +122,13 @@ def profile():
                 session['profile_update_data'] = request.form.to_dict()
                 
                 # Send OTP to NEW email
-                otp = str(random.randint(100000, 999999))
-                expiry = datetime.now() + timedelta(minutes=10)
-                
-                new_otp = VerificationOTP(email=new_email, otp=otp, purpose='email_update', expires_at=expiry)
-                db.session.add(new_otp)
-                db.session.commit()
-                
+                otp = otp_store.issue('email_update', new_email)
                 send_verification_email(new_email, otp, "Email Change Verification")
                 return redirect(url_for('mediconnect_patient.verify_email_update'))
         if phone_no:
             patient.user.phone_no = phone_no
         if password:
-            patient.user.password = generate_password_hash(password)
+            patient.user.password = password_hasher.hash(password)
 
 
         dob_str = request.form.get("dob") #updating patient info
@@ -156,50 +156,42 @@ def profile():
 
 
 @patient_bp.route('/verify-email-update', methods=['GET', 'POST'])
+@login_required("patient")
 def verify_email_update():
-    user_id = session.get("user_id")
-    if not user_id or 'profile_update_data' not in session:
+    if 'profile_update_data' not in session:
         return redirect(url_for('mediconnect_patient.dashboard'))
         
     data = session['profile_update_data']
     new_email = data['email']
     
     if request.method == 'POST':
-        otp_input = request.form.get('otp')
-        record = VerificationOTP.query.filter_by(email=new_email, purpose='email_update').order_by(VerificationOTP.id.desc()).first()
+        result = otp_store.verify('email_update', new_email, request.form.get('otp'))
         
-        if record and record.otp == otp_input and record.expires_at > datetime.now():
-            patient = Patient.query.filter_by(user_id=user_id).first()
+        if result == VALID:
+            patient = g.patient
             patient.user.email = new_email
             patient.user.full_name = data['full_name']
             patient.user.phone_no = data['phone_no']
             if data['password']:
-                 patient.user.password = generate_password_hash(data['password'])
+                 patient.user.password = password_hasher.hash(data['password'])
             
             patient.address = data['address']
             
-            VerificationOTP.query.filter_by(email=new_email, purpose='email_update').delete()
             db.session.commit()
+            otp_store.consume('email_update', new_email)
             session.pop('profile_update_data', None)
             flash("Profile and Email updated successfully.", "success")
             return redirect(url_for('mediconnect_patient.profile'))
         else:
-            flash("Invalid OTP", "error")
+            flash(OTP_ERRORS[result], "error")
             
     return render_template('verify_action.html', title="Verify Email Update", action_url=url_for('mediconnect_patient.verify_email_update'))
 
 
 @patient_bp.route("/book-appointment", methods=["GET", "POST"])
+@login_required("patient")
 def book_appointment():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    patient = Patient.query.filter_by(user_id=user_id).first()
-    if not patient:
-        flash("Patient record not found.", "error")
-        return redirect(url_for("mediconnect_patient.dashboard"))
+    patient = g.patient
 
     search_term = request.args.get("search", "").strip()
     search_by = request.args.get("search_by", "name")
@@ -212,7 +204,7 @@ def book_appointment():
         elif search_by == "department":
             doctors_query = doctors_query.filter(Department.name.ilike(f"%{search_term}%"))
 
-    doctors = doctors_query.all()
+    doctors = paginate_doctors(doctors_query)
 
     selected_doctor_id = request.args.get("doctor_id", type=int)
     selected_doctor = None
@@ -226,19 +218,17 @@ def book_appointment():
             flash("This doctor is currently not available.", "error")
             return redirect(url_for("mediconnect_patient.book_appointment"))
 
-        available_slots = Slot.query.filter_by(
-            doctor_id=selected_doctor_id,
-            status="Available"
-        ).order_by(Slot.date, Slot.time).all()
+        slots_after = decode_cursor(request.args.get("slots_after"), (date, time, int))
+        available_slots = availability_cache.page(selected_doctor_id, slots_after, get_page_size(SLOT_PAGE_SIZE, "slots_per_page"))
 
         if not available_slots:
             flash("No available slots for this doctor.", "info")
 
     if request.method == "POST":
-        slot_id = int(request.form.get("slot_id", 0))
+        slot_choice = request.form.get("slot_id", "")
         doctor_id = int(request.form.get("doctor_id", 0))
 
-        if not slot_id or not doctor_id:
+        if not slot_choice or not doctor_id:
             flash("Please select a doctor and a slot.", "error")
             return redirect(url_for("mediconnect_patient.book_appointment"))
 
@@ -249,31 +239,23 @@ def book_appointment():
             flash("This doctor is no longer available.", "error")
             return redirect(url_for("mediconnect_patient.book_appointment"))
 
-        slot = Slot.query.get_or_404(slot_id)
-        if slot.status != "Available":
+        #rule-generated times get their slot row here, then the slot is claimed atomically
+        slot_id = resolve_slot(doctor_id, slot_choice)
+        new_appointment = book_slot(patient.patient_id, slot_id, doctor_id) if slot_id else None
+        if not new_appointment:
             flash("Selected slot is no longer available.", "error")
-            return redirect(url_for("mediconnect_patient.book_appointment"))
-
-        slot.status = "Booked"
+            return redirect(url_for("mediconnect_patient.book_appointment", doctor_id=doctor_id))
 
-        new_appointment = Appointment(
-            patient_id=patient.patient_id,
-            doctor_id=slot.doctor_id,
-            slot_id=slot.slot_id,
-            status="Booked",
-            created_at=datetime.now()
-        )
-
-        db.session.add(new_appointment)
-        db.session.commit()
+        slot = new_appointment.slot
+        audit_log.record("book_appointment", "appointment", new_appointment.appointment_id, slot_id=slot_id)
 
         send_appointment_booking_email(
             patient.user.email,
             patient.user.full_name,
-            selected_doctor.user.full_name,
+            doctor_active.user.full_name,
             slot.date,
             slot.time.strftime('%I:%M %p'),
-            selected_doctor.department.name if selected_doctor.department else 'N/A'
+            doctor_active.department.name if doctor_active.department else 'N/A'
         )
 
         flash("Appointment booked successfully!", "success")
@@ -291,20 +273,14 @@ def book_appointment():
 
 
 @patient_bp.route("/cancel-appointment/<int:appointment_id>", methods=["POST"])
+@login_required("patient")
 def cancel_appointment(appointment_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
     appointment = Appointment.query.get_or_404(appointment_id)
 
-    if appointment.patient.user_id != user_id:
+    if appointment.patient_id != g.patient.patient_id:
         flash("Not authorized to cancel this appointment.", "error")
         return redirect(url_for("mediconnect_patient.dashboard"))
 
-    appointment.status = "Cancelled"
-
     appt_date = appointment.slot.date if appointment.slot else 'Unknown Date'
     appt_time = appointment.slot.time.strftime('%I:%M %p') if appointment.slot else 'Unknown Time'
     
@@ -315,59 +291,60 @@ def cancel_appointment(appointment_id):
         appt_time
     )
 
-    if appointment.slot:
-        appointment.slot.status = "Available"
-        appointment.slot_id = None
+    #status changes come after the lazy loads above so autoflush can't write a half-cancelled row
+    appointment.status = "Cancelled"
+    freed_slot = appointment.slot
+    if freed_slot:
+        freed_slot.status = "Available"
+        appointment.slot = None
 
     db.session.commit()
+    audit_log.record("cancel_appointment", "appointment", appointment_id)
+
+    if freed_slot:
+        availability_cache.add(freed_slot.doctor_id, freed_slot.date, freed_slot.time, freed_slot.slot_id)
+
     flash("Appointment cancelled successfully.", "success")
     return redirect(url_for("mediconnect_patient.dashboard"))
 
 
 @patient_bp.route("/reschedule-appointment/<int:appointment_id>", methods=["GET", "POST"])
+@login_required("patient")
 def reschedule_appointment(appointment_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    appointment = Appointment.query.get_or_404(appointment_id)
+    appointment = (
+        Appointment.query
+        .options(joinedload(Appointment.slot), joinedload(Appointment.doctor).joinedload(Doctor.user))
+        .filter_by(appointment_id=appointment_id)
+        .first_or_404()
+    )
     if appointment.doctor and appointment.doctor.user.status != "active":
         flash("This doctor is currently not available. You cannot reschedule this appointment.", "error")
         return redirect(url_for("mediconnect_patient.dashboard"))
 
 
-    if appointment.patient.user_id != user_id:
+    if appointment.patient_id != g.patient.patient_id:
         flash("Not authorized to reschedule this appointment.", "error")
         return redirect(url_for("mediconnect_patient.dashboard"))
 
     doctor_id = appointment.doctor_id
 
-    available_slots = Slot.query.filter_by(
-        doctor_id=doctor_id,
-        status="Available"
-    ).order_by(Slot.date, Slot.time).all()
+    slots_after = decode_cursor(request.args.get("slots_after"), (date, time, int))
+    available_slots = availability_cache.page(doctor_id, slots_after, get_page_size(SLOT_PAGE_SIZE, "slots_per_page"))
 
     if not available_slots and request.method == "GET":
         flash("No free slots available for this doctor.", "info")
         return redirect(url_for("mediconnect_patient.dashboard"))
 
     if request.method == "POST":
-        new_slot_id = request.form.get("slot_id")
-        new_slot = Slot.query.get_or_404(new_slot_id)
+        new_slot_id = resolve_slot(doctor_id, request.form.get("slot_id"))
 
-        if new_slot.status != "Available":
+        #claims the new slot, frees the old one and repoints the appointment in one transaction
+        if not new_slot_id or not swap_slot(appointment.appointment_id, appointment.slot, new_slot_id, doctor_id):
             flash("Selected slot is no longer available.", "error")
             return redirect(url_for("mediconnect_patient.reschedule_appointment", appointment_id=appointment_id))
 
-        if appointment.slot:
-            appointment.slot.status = "Available" #freeing old slot
-
-        appointment.slot_id = new_slot.slot_id
-        new_slot.status = "Booked"
-        appointment.status = "Booked"
-
-        db.session.commit()
+        new_slot = db.session.get(Slot, new_slot_id)
+        audit_log.record("reschedule_appointment", "appointment", appointment_id, slot_id=new_slot_id)
 
         send_appointment_reschedule_email(
             appointment.patient.user.email,
@@ -388,20 +365,18 @@ def reschedule_appointment(appointment_id):
 
 
 @patient_bp.route("/delete-account", methods=["POST"])
+@login_required("patient")
 def delete_account():
-    user_id = session.get("user_id")
-    if not user_id:
-        flash("Please log in first.", "error")
-        return redirect(url_for("mediconnect.login"))
-
-    user = User.query.get(user_id)
-    if not user:
-        flash("User not found.", "error")
-        return redirect(url_for("mediconnect_patient.dashboard"))
+    user = g.user
+    user_id = user.user_id
 
     # patient will be auto-deleted via delete-on-cascade
+    affected_doctors = release_user_slots([user_id])
     db.session.delete(user)
     db.session.commit()
+    for doctor_id in affected_doctors:
+        availability_cache.invalidate(doctor_id)
+    audit_log.record("delete_account", "user", user_id)
 
     session.clear()
     flash("Your account has been deleted successfully.", "success")
@@ -1,8 +1,9 @@
 from flask_mail import Message
 from models import mail
-from flask import url_for, current_app
+from flask import url_for, current_app, g
 from datetime import datetime
 from threading import Thread
+from contextlib import contextmanager
 
 def send_async_email(app, msg):
     """Background task to send email."""
@@ -12,10 +13,51 @@ def send_async_email(app, msg):
         except Exception as e:
             print(f"Error sending email: {e}")
 
+def send_async_batch(app, messages):
+    """Background task to send a batch of emails over one SMTP connection."""
+    with app.app_context():
+        try:
+            with mail.connect() as conn:
+                for msg in messages:
+                    try:
+                        conn.send(msg)
+                    except Exception as e:
+                        print(f"Error sending email to {msg.recipients}: {e}")
+        except Exception as e:
+            print(f"Error opening mail connection: {e}")
+
+@contextmanager
+def email_batch():
+    """Holds back every email sent inside the block and delivers them together when it exits.
+
+    All of them go out from one background thread over a single SMTP
+    connection. If the block raises, nothing is sent.
+    """
+    if g.get("email_batch") is not None:
+        #already inside a batch, the outer block sends
+        yield
+        return
+
+    g.email_batch = []
+    try:
+        yield
+        messages = g.email_batch
+    finally:
+        g.pop("email_batch", None)
+
+    if messages:
+        app = current_app._get_current_object()
+        Thread(target=send_async_batch, args=(app, messages)).start()
+
 def send_email(subject, recipients, html_body):
     """Generic helper to send emails asynchronously."""
     try:
         msg = Message(subject, recipients=recipients, html=html_body)
+
+        batch = g.get("email_batch")
+        if batch is not None:
+            batch.append(msg)
+            return
         
         # Get the actual application instance to pass to the thread
         app = current_app._get_current_object()
@@ -92,6 +134,32 @@ def send_doctor_credentials_email(full_name, email, password):
     """
     send_email("MediConnect - Doctor Account Credentials", [email], html_body)
 
+def send_patient_credentials_email(full_name, email, password):
+    html_body = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>{get_common_style()}</head>
+    <body>
+        <div class="container">
+            <div class="header" style="background-color: #007bff;">
+                <h1>Welcome to MediConnect!</h1>
+            </div>
+            <div class="content">
+                <p>Hello {full_name},</p>
+                <p>Your hospital has moved its patient records to MediConnect and an account has been created for you.</p>
+                <div class="info-box" style="border-color: #007bff;">
+                    <p><strong>Login Email:</strong> {email}</p>
+                    <p><strong>Temporary Password:</strong> {password}</p>
+                </div>
+                <p>Please login and change your password immediately.</p>
+            </div>
+            <div class="footer">&copy; {datetime.now().year} MediConnect.</div>
+        </div>
+    </body>
+    </html>
+    """
+    send_email("MediConnect - Your Patient Account", [email], html_body)
+
 def send_welcome_email(full_name, email):
     html_body = f"""
     <!DOCTYPE html>
@@ -0,0 +1,127 @@
+from flask import Response, stream_with_context
+from models import db, Appointment, Doctor, Patient, Slot, Treatment, User
+from history_utils import join_appointment_details, filter_appointments, patient_user, doctor_user
+from search_utils import filter_patients, search_terms, treatment_hits
+from datetime import datetime, date, time
+import csv
+import io
+import json
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def appointments_export(args):
+    """Appointment rows for an export, filtered like the admin appointments page."""
+    columns = [
+        Appointment.appointment_id, Appointment.created_at, Appointment.status,
+        Slot.date, Slot.time,
+        Patient.patient_id, patient_user.full_name, patient_user.email,
+        Doctor.doctor_id, doctor_user.full_name, Treatment.diagnosed_by
+    ]
+    headers = [
+        "appointment_id", "created_at", "status", "date", "time",
+        "patient_id", "patient_name", "patient_email",
+        "doctor_id", "doctor_name", "diagnosed_by"
+    ]
+    query = join_appointment_details(db.session.query(*columns).select_from(Appointment))
+    query = filter_appointments(
+        query,
+        args.get("q", "").strip(),
+        args.get("search_by", "patient"),
+        args.get("date_from", type=date.fromisoformat),
+        args.get("date_to", type=date.fromisoformat)
+    )
+    return headers, query.order_by(Appointment.appointment_id)
+
+def patients_export(args):
+    """Patient rows for an export, filtered like the admin patients page."""
+    columns = [
+        Patient.patient_id, User.user_id, User.full_name, User.email, User.phone_no, User.status,
+        Patient.dob, Patient.gender, Patient.blood_group, Patient.address, Patient.emergency_contact
+    ]
+    headers = [
+        "patient_id", "user_id", "full_name", "email", "phone_no", "status",
+        "dob", "gender", "blood_group", "address", "emergency_contact"
+    ]
+    query = db.session.query(*columns).select_from(Patient).join(User, Patient.user_id == User.user_id)
+    query = filter_patients(query, args.get("q", "").strip(), args.get("search_by", "name"))
+    return headers, query.order_by(Patient.patient_id)
+
+def treatments_export(args):
+    """Treatment rows for an export; `q` narrows them with the full-text index."""
+    columns = [
+        Treatment.treatment_id, Appointment.appointment_id, Slot.date,
+        Patient.patient_id, User.full_name,
+        Treatment.diagnosed_by, Treatment.diagnosis, Treatment.prescription, Treatment.notes
+    ]
+    headers = [
+        "treatment_id", "appointment_id", "date", "patient_id", "patient_name",
+        "diagnosed_by", "diagnosis", "prescription", "notes"
+    ]
+    query = (
+        db.session.query(*columns)
+        .select_from(Treatment)
+        .join(Appointment, Treatment.appointment_id == Appointment.appointment_id)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+    )
+    terms = search_terms(args.get("q"))
+    if terms:
+        hits = treatment_hits(terms)
+        query = query.join(hits, hits.c.treatment_id == Treatment.treatment_id)
+    return headers, query.order_by(Treatment.treatment_id)
+
+EXPORTS = {
+    "appointments": appointments_export,
+    "patients": patients_export,
+    "treatments": treatments_export,
+}
+
+def csv_safe(value):
+    """Stops spreadsheet apps from running a cell that starts like a formula."""
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+def json_value(value):
+    """Dates and times as ISO strings, everything else as it is."""
+    return value.isoformat() if isinstance(value, (date, time)) else value
+
+def csv_chunks(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([csv_safe(v) for v in row])
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def ndjson_chunks(headers, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(headers, (json_value(v) for v in row)))))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def stream_export(name, headers, query, fmt):
+    """Streams a column query as a CSV or NDJSON download.
+
+    Rows are fetched EXPORT_BATCH_SIZE at a time through a server-side cursor
+    and written out chunk by chunk, so memory stays flat however many rows
+    the export has.
+    """
+    rows = query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+    chunks = csv_chunks(headers, rows) if fmt == "csv" else ndjson_chunks(headers, rows)
+    filename = f"{name}-{datetime.now():%Y%m%d-%H%M}.{fmt}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
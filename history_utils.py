@@ -0,0 +1,124 @@
+from flask import request
+from models import Appointment, Doctor, Patient, Slot, Treatment, User
+from pagination_utils import keyset_paginate, decode_cursor, get_page_size
+from sqlalchemy import or_, false
+from sqlalchemy.orm import aliased, contains_eager, selectinload
+from datetime import datetime, time
+
+HISTORY_PAGE_SIZE = 20
+APPOINTMENT_PAGE_SIZE = 50
+SUMMARY_VISITS = 5
+
+def history_query(patient_id):
+    """A patient's appointments with everything the history tables show loaded up front.
+
+    Slot and treatment come from the joins; doctors and their users are fetched
+    with one extra selectin query however many rows there are.
+    """
+    return (
+        Appointment.query
+        .filter(Appointment.patient_id == patient_id)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.appointment_id)
+        .options(
+            contains_eager(Appointment.slot),
+            contains_eager(Appointment.treatment),
+            selectinload(Appointment.doctor).joinedload(Doctor.user)
+        )
+    )
+
+def paginate_patient_history(patient_id, arg="after"):
+    """Newest-first page of a patient's history, keyed on (created_at, appointment_id)."""
+    after = decode_cursor(request.args.get(arg), (datetime, int))
+    return keyset_paginate(
+        history_query(patient_id),
+        (Appointment.created_at, Appointment.appointment_id),
+        key=lambda a: (a.created_at, a.appointment_id),
+        after=after,
+        per_page=get_page_size(HISTORY_PAGE_SIZE),
+        descending=True
+    )
+
+def recent_visits(patient_id, limit=SUMMARY_VISITS, exclude_appointment_id=None):
+    """The patient's last `limit` completed visits, newest first, for the treatment screen."""
+    query = history_query(patient_id).filter(Appointment.status == "Completed")
+    if exclude_appointment_id:
+        query = query.filter(Appointment.appointment_id != exclude_appointment_id)
+    return query.order_by(Appointment.created_at.desc(), Appointment.appointment_id.desc()).limit(limit).all()
+
+patient_user = aliased(User, name="patient_user")
+doctor_user = aliased(User, name="doctor_user")
+
+def join_appointment_details(query):
+    """Joins an appointments query to its patient and doctor users, slot and treatment."""
+    return (
+        query
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(patient_user, Patient.user_id == patient_user.user_id)
+        .outerjoin(Doctor, Appointment.doctor_id == Doctor.doctor_id)
+        .outerjoin(doctor_user, Doctor.user_id == doctor_user.user_id)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.appointment_id)
+    )
+
+def appointments_query():
+    """Every appointment joined to its patient, doctor, slot and treatment, all loaded by the joins."""
+    return (
+        join_appointment_details(Appointment.query)
+        .options(
+            contains_eager(Appointment.patient).contains_eager(Patient.user.of_type(patient_user)),
+            contains_eager(Appointment.doctor).contains_eager(Doctor.user.of_type(doctor_user)),
+            contains_eager(Appointment.slot),
+            contains_eager(Appointment.treatment)
+        )
+    )
+
+def parse_hour_range(value):
+    """Turns "HH" or "HH:MM" into the (first, last) times it covers; None if it is neither."""
+    for fmt in ("%H:%M", "%H"):
+        try:
+            start = datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+        return (start, start) if fmt == "%H:%M" else (start, time(start.hour, 59, 59))
+    return None
+
+def filter_appointments(query, q="", search_by="patient", date_from=None, date_to=None):
+    """Applies the admin appointment filters. Date and time filters are plain ranges on Slot columns."""
+    if date_from:
+        query = query.filter(Slot.date >= date_from)
+    if date_to:
+        query = query.filter(Slot.date <= date_to)
+
+    if not q:
+        return query
+
+    if search_by == "patient":
+        match = patient_user.full_name.ilike(f"%{q}%")
+        return query.filter(or_(match, Patient.patient_id == int(q)) if q.isdigit() else match)
+
+    if search_by == "doctor":
+        return query.filter(or_(doctor_user.full_name.ilike(f"%{q}%"), Treatment.diagnosed_by.ilike(f"%{q}%")))
+
+    if search_by == "time":
+        hours = parse_hour_range(q)
+        if hours is None:
+            return query.filter(false())
+        return query.filter(Slot.time >= hours[0], Slot.time <= hours[1])
+
+    if search_by == "status":
+        return query.filter(Appointment.status == q.capitalize())
+
+    return query
+
+def paginate_appointments(query, arg="after"):
+    """Newest-first page of an appointments_query(), keyed on (created_at, appointment_id)."""
+    after = decode_cursor(request.args.get(arg), (datetime, int))
+    return keyset_paginate(
+        query,
+        (Appointment.created_at, Appointment.appointment_id),
+        key=lambda a: (a.created_at, a.appointment_id),
+        after=after,
+        per_page=get_page_size(APPOINTMENT_PAGE_SIZE),
+        descending=True
+    )
@@ -0,0 +1,208 @@
+from flask import current_app
+from models import db, User, Doctor, Patient, Department
+from email_utils import email_batch, send_doctor_credentials_email, send_patient_credentials_email
+from stats_utils import bump_stats
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from password_utils import password_hasher
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+import csv
+import os
+import re
+import secrets
+
+IMPORT_BATCH_SIZE = 500
+HASH_CHUNK_SIZE = 8
+MAX_REPORTED_ERRORS = 200
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+#the values the patient forms store, and the gender filter searches for
+GENDERS = ("male", "female", "other")
+
+#password is optional in every file; a random one is generated when it is blank
+IMPORT_COLUMNS = {
+    "doctor": ["full_name", "email", "phone_no", "department", "qualification", "experience_years"],
+    "patient": ["full_name", "email", "phone_no", "dob", "gender", "blood_group", "address", "emergency_contact"]
+}
+
+class ImportResult:
+    """What an import did: how many accounts it created and which lines it rejected."""
+
+    def __init__(self):
+        self.created = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+def required(row, field, max_length=None):
+    value = (row.get(field) or "").strip()
+    if not value:
+        raise ValueError(f"{field} is required")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+def user_fields(row, role):
+    email = required(row, "email", 50)
+    if not EMAIL_PATTERN.fullmatch(email):
+        raise ValueError(f"{email} is not a valid email address")
+    phone_no = required(row, "phone_no", 10)
+    if not phone_no.isdigit():
+        raise ValueError("phone_no must be digits only")
+    return {
+        "full_name": required(row, "full_name", 50),
+        "email": email,
+        "phone_no": phone_no,
+        "role": role,
+        "status": "active"
+    }
+
+def doctor_fields(row, departments):
+    department = required(row, "department")
+    department_id = departments.get(department.lower())
+    if department_id is None:
+        raise ValueError(f"unknown department {department}")
+    experience_years = required(row, "experience_years")
+    if not experience_years.isdigit():
+        raise ValueError("experience_years must be a whole number")
+    return {
+        "department_id": department_id,
+        "qualification": required(row, "qualification", 20),
+        "experience_years": int(experience_years)
+    }
+
+def patient_fields(row, departments):
+    dob = required(row, "dob")
+    try:
+        dob = datetime.strptime(dob, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("dob must be YYYY-MM-DD")
+    today = datetime.now().date()
+    if dob > today or dob < today.replace(year=today.year - 125):
+        raise ValueError("dob is out of range")
+    gender = required(row, "gender").lower()
+    if gender not in GENDERS:
+        raise ValueError(f"gender must be one of {', '.join(GENDERS)}")
+    return {
+        "dob": dob,
+        "gender": gender,
+        "blood_group": required(row, "blood_group", 3),
+        "address": required(row, "address", 100),
+        "emergency_contact": required(row, "emergency_contact", 10)
+    }
+
+PROFILES = {
+    "doctor": (Doctor, doctor_fields, send_doctor_credentials_email),
+    "patient": (Patient, patient_fields, send_patient_credentials_email)
+}
+
+def hash_passwords(passwords, pool):
+    """Hashes the batch across the pool's processes, or in this one without a pool."""
+    if pool is None:
+        return [password_hasher.hash(p) for p in passwords]
+    return list(pool.map(password_hasher.hash_function(), passwords, chunksize=HASH_CHUNK_SIZE))
+
+def numbered_rows(reader):
+    for row in reader:
+        yield reader.line_num, row
+
+def import_users(role, lines, send_emails=True):
+    """Creates doctor or patient accounts from CSV lines.
+
+    The file is read IMPORT_BATCH_SIZE rows at a time. Each batch is
+    validated, hashed across IMPORT_HASH_WORKERS processes and written as
+    one multi-row INSERT per table in its own transaction, after which its
+    credential emails go out together. Bad rows are reported by line
+    number and skipped; the rest of the file is still imported.
+    """
+    reader = csv.DictReader(lines)
+    missing = [c for c in IMPORT_COLUMNS[role] if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    departments = {}
+    for department_id, name in db.session.query(Department.department_id, Department.name):
+        departments[name.lower()] = department_id
+        departments[str(department_id)] = department_id
+
+    result = ImportResult()
+    seen = set()
+    rows = numbered_rows(reader)
+    workers = current_app.config.get("IMPORT_HASH_WORKERS", os.cpu_count() or 1)
+
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while batch := list(islice(rows, IMPORT_BATCH_SIZE)):
+            import_batch(role, batch, departments, seen, pool, result, send_emails)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return result
+
+def import_batch(role, batch, departments, seen, pool, result, send_emails):
+    model, profile_fields, send_credentials = PROFILES[role]
+
+    valid = []
+    for line, row in batch:
+        try:
+            user = user_fields(row, role)
+            profile = profile_fields(row, departments)
+        except ValueError as e:
+            result.reject(line, str(e))
+            continue
+        if user["email"] in seen:
+            result.reject(line, f"{user['email']} appears earlier in the file")
+            continue
+        seen.add(user["email"])
+        password = (row.get("password") or "").strip() or secrets.token_urlsafe(9)
+        valid.append((line, user, profile, password))
+
+    existing = set(db.session.scalars(
+        select(User.email).where(User.email.in_([user["email"] for _, user, _, _ in valid]))
+    ))
+    for line, user, _, _ in valid:
+        if user["email"] in existing:
+            result.reject(line, f"{user['email']} already has an account")
+    valid = [v for v in valid if v[1]["email"] not in existing]
+    if not valid:
+        return
+
+    hashes = hash_passwords([password for *_, password in valid], pool)
+    users = [dict(user, password=hashed) for (_, user, _, _), hashed in zip(valid, hashes)]
+
+    try:
+        #bulk inserts skip the mapper hooks, so the counters are bumped here
+        db.session.execute(insert(User), users)
+        user_ids = dict(db.session.execute(
+            select(User.email, User.user_id).where(User.email.in_([user["email"] for user in users]))
+        ).all())
+        db.session.execute(
+            insert(model),
+            [dict(profile, user_id=user_ids[user["email"]]) for _, user, profile, _ in valid]
+        )
+        deltas = {"active_users": len(valid), f"{role}s": len(valid), f"active_{role}s": len(valid)}
+        if role == "doctor":
+            for _, _, profile, _ in valid:
+                key = ("department_active_doctors", profile["department_id"])
+                deltas[key] = deltas.get(key, 0) + 1
+        bump_stats(db.session.connection(), deltas)
+
+        with email_batch():
+            db.session.commit()
+            if send_emails:
+                for _, user, _, password in valid:
+                    send_credentials(user["full_name"], user["email"], password)
+
+    except IntegrityError:
+        #an account created while the batch was being hashed
+        db.session.rollback()
+        for line, *_ in valid:
+            result.reject(line, "rejected by the database, the batch was not imported")
+        return
+
+    result.created += len(valid)
@@ -1,10 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, UTC
 from flask_mail import Mail
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
 
 db = SQLAlchemy()
 mail = Mail()
 
+#the relationships below leave child rows to the ON DELETE clauses (passive_deletes),
+#which SQLite only enforces when foreign keys are switched on for each connection
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 class Admin(db.Model):
     __tablename__ = 'admin'
     admin_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -15,7 +27,7 @@ class Admin(db.Model):
 class User(db.Model):
     __tablename__ = 'users'
     user_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    full_name = db.Column(db.String(50), nullable=False)
+    full_name = db.Column(db.String(50), nullable=False, index=True)
     email = db.Column(db.String(50), nullable=False, unique=True)
     password = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(10), nullable=False)
@@ -23,8 +35,8 @@ class User(db.Model):
     status = db.Column(db.String(20), nullable=False, default='active')
     totp_secret = db.Column(db.String(32))
 
-    doctor = db.relationship('Doctor', back_populates='user', uselist=False, cascade='all, delete-orphan')
-    patient = db.relationship('Patient', back_populates='user', uselist=False, cascade='all, delete-orphan')
+    doctor = db.relationship('Doctor', back_populates='user', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
+    patient = db.relationship('Patient', back_populates='user', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
 
 class Department(db.Model):
     __tablename__ = 'departments'
@@ -32,7 +44,7 @@ class Department(db.Model):
     name = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(100), nullable=False)
 
-    doctors = db.relationship('Doctor', back_populates='department', cascade='all, delete-orphan')
+    doctors = db.relationship('Doctor', back_populates='department', cascade='all, delete-orphan', passive_deletes=True)
 
 class Doctor(db.Model):
     __tablename__ = 'doctors'
@@ -44,8 +56,9 @@ class Doctor(db.Model):
 
     user = db.relationship('User', back_populates='doctor')
     department = db.relationship('Department', back_populates='doctors')
-    slots = db.relationship('Slot', back_populates='doctor', cascade='all, delete-orphan')
-    appointments = db.relationship('Appointment', back_populates='doctor', cascade='all, delete-orphan')
+    slots = db.relationship('Slot', back_populates='doctor', cascade='all, delete-orphan', passive_deletes=True)
+    appointments = db.relationship('Appointment', back_populates='doctor', cascade='all, delete-orphan', passive_deletes=True)
+    availability_rules = db.relationship('AvailabilityRule', back_populates='doctor', cascade='all, delete-orphan', passive_deletes=True)
 
 class Patient(db.Model):
     __tablename__ = 'patients'
@@ -58,10 +71,16 @@ class Patient(db.Model):
     emergency_contact = db.Column(db.String(10), nullable=False)
 
     user = db.relationship('User', back_populates='patient')
-    appointments = db.relationship('Appointment', back_populates='patient', cascade='all, delete-orphan')
+    appointments = db.relationship('Appointment', back_populates='patient', cascade='all, delete-orphan', passive_deletes=True)
 
 class Slot(db.Model):
     __tablename__ = 'slots'
+    __table_args__ = (
+        db.Index('ix_slots_doctor_status_date_time', 'doctor_id', 'status', 'date', 'time'),
+        db.Index('ix_slots_date_time', 'date', 'time'),
+        db.CheckConstraint("status IN ('Available', 'Booked')", name='ck_slots_status'),
+        db.UniqueConstraint('doctor_id', 'date', 'time', name='uq_slots_doctor_date_time'),
+    )
     slot_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.doctor_id', ondelete='CASCADE'))
     date = db.Column(db.Date, nullable=False)
@@ -69,10 +88,41 @@ class Slot(db.Model):
     status = db.Column(db.String(20), nullable=False, default='Available')
 
     doctor = db.relationship('Doctor', back_populates='slots')
-    appointment = db.relationship('Appointment', back_populates='slot', uselist=False)
+    appointment = db.relationship('Appointment', back_populates='slot', uselist=False, passive_deletes=True)
+
+class AvailabilityRule(db.Model):
+    __tablename__ = 'availability_rules'
+    rule_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.doctor_id', ondelete='CASCADE'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False) # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    interval_minutes = db.Column(db.Integer, nullable=False, default=30)
+    valid_from = db.Column(db.Date, nullable=False)
+    valid_until = db.Column(db.Date) # open-ended when empty
+
+    doctor = db.relationship('Doctor', back_populates='availability_rules')
+    exceptions = db.relationship('AvailabilityException', back_populates='rule', cascade='all, delete-orphan', passive_deletes=True)
+
+class AvailabilityException(db.Model):
+    __tablename__ = 'availability_exceptions'
+    __table_args__ = (
+        db.UniqueConstraint('rule_id', 'date', name='uq_availability_exceptions_rule_date'),
+    )
+    exception_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey('availability_rules.rule_id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False) # the rule is skipped on this day
+
+    rule = db.relationship('AvailabilityRule', back_populates='exceptions')
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_patient_created', 'patient_id', 'created_at', 'appointment_id'),
+        db.Index('ix_appointments_created', 'created_at', 'appointment_id'),
+        db.CheckConstraint("status IN ('Booked', 'Completed', 'Cancelled')", name='ck_appointments_status'),
+        db.CheckConstraint("status != 'Cancelled' OR slot_id IS NULL", name='ck_appointments_cancelled_slot'), #cancelling always hands the slot back
+    )
     appointment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     slot_id = db.Column(db.Integer, db.ForeignKey('slots.slot_id', ondelete='SET NULL'), unique=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.patient_id', ondelete='CASCADE'))
@@ -83,7 +133,7 @@ class Appointment(db.Model):
     slot = db.relationship('Slot', back_populates='appointment')
     doctor = db.relationship('Doctor', back_populates='appointments')
     patient = db.relationship('Patient', back_populates='appointments')
-    treatment = db.relationship('Treatment', back_populates='appointment', uselist=False, cascade='all, delete-orphan')
+    treatment = db.relationship('Treatment', back_populates='appointment', uselist=False, cascade='all, delete-orphan', passive_deletes=True)
 
 class Treatment(db.Model):
     __tablename__ = 'treatments'
@@ -96,18 +146,37 @@ class Treatment(db.Model):
 
     appointment = db.relationship('Appointment', back_populates='treatment')
 
-class PasswordResetOTP(db.Model):
-    __tablename__ = "password_reset_otp"
-
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id", ondelete='CASCADE'))
-    otp = db.Column(db.String(6), nullable=False)
+class OneTimeCode(db.Model):
+    __tablename__ = "one_time_codes"
+    __table_args__ = (
+        db.Index('ix_one_time_codes_expires', 'expires_at'),
+    )
+    #one live code per subject and purpose; issuing a new one replaces it
+    purpose = db.Column(db.String(20), primary_key=True) # 'register', 'admin_login', 'password_reset', ...
+    subject = db.Column(db.String(50), primary_key=True) # email, or user id for password resets
+    code = db.Column(db.String(6), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
     expires_at = db.Column(db.DateTime, nullable=False)
 
-class VerificationOTP(db.Model):
-    __tablename__ = "verification_otp"
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(50), nullable=False) # Store email instead of ID
-    otp = db.Column(db.String(6), nullable=False)
-    purpose = db.Column(db.String(20), nullable=False) # 'admin_login', 'register', 'email_update'
-    expires_at = db.Column(db.DateTime, nullable=False)
\ No newline at end of file
+class SystemStat(db.Model):
+    __tablename__ = "system_stats"
+    name = db.Column(db.String(40), primary_key=True)
+    department_id = db.Column(db.Integer, primary_key=True, default=0) # 0 for system-wide counters
+    shard = db.Column(db.Integer, primary_key=True, default=0) # a counter is the sum of its shards
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class AuditEvent(db.Model):
+    __tablename__ = "audit_events"
+    __table_args__ = (
+        db.Index('ix_audit_events_created', 'created_at', 'audit_id'),
+        db.Index('ix_audit_events_target', 'target_type', 'target_id', 'created_at', 'audit_id'),
+    )
+    audit_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    actor_role = db.Column(db.String(10), nullable=False) # 'admin', 'doctor' or 'patient'
+    actor_id = db.Column(db.Integer) # no foreign key, the trail has to outlive deleted accounts
+    action = db.Column(db.String(40), nullable=False)
+    target_type = db.Column(db.String(20))
+    target_id = db.Column(db.Integer)
+    details = db.Column(db.Text) # JSON, kept whole so bulk events list every id
+    ip_address = db.Column(db.String(45))
@@ -0,0 +1,165 @@
+from models import db, OneTimeCode
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta
+from threading import Lock
+import hmac
+import secrets
+import time
+
+#what verify() can answer
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+#flash message for each way verify() can fail
+OTP_ERRORS = {
+    INVALID: "Incorrect OTP. Please try again.",
+    EXPIRED: "OTP expired or invalid. Please request a new one.",
+    LOCKED: "Too many incorrect attempts. Please request a new OTP."
+}
+
+def new_code():
+    return f"{secrets.randbelow(1000000):06d}"
+
+class DatabaseOTPBackend:
+    """Codes in the one_time_codes table, shared by every worker."""
+
+    def issue(self, purpose, subject, code, expires_at):
+        connection = db.session.connection()
+        insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(OneTimeCode).values(purpose=purpose, subject=subject, code=code, attempts=0, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["purpose", "subject"],
+            set_={"code": stmt.excluded.code, "attempts": 0, "expires_at": stmt.excluded.expires_at}
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+
+    def verify(self, purpose, subject, code, now, max_attempts):
+        key = (OneTimeCode.purpose == purpose, OneTimeCode.subject == subject)
+        row = db.session.execute(select(OneTimeCode.code, OneTimeCode.expires_at).where(*key)).first()
+        if row is None or row.expires_at <= now:
+            return EXPIRED
+        if hmac.compare_digest(row.code, code):
+            return VALID
+
+        #the increment is one statement, so parallel guesses cannot share an attempt
+        attempts = db.session.execute(
+            update(OneTimeCode).where(*key).values(attempts=OneTimeCode.attempts + 1).returning(OneTimeCode.attempts)
+        ).scalar()
+        if attempts is not None and attempts >= max_attempts:
+            db.session.execute(delete(OneTimeCode).where(*key))
+            db.session.commit()
+            return LOCKED
+        db.session.commit()
+        return INVALID
+
+    def consume(self, purpose, subject):
+        db.session.execute(delete(OneTimeCode).where(OneTimeCode.purpose == purpose, OneTimeCode.subject == subject))
+        db.session.commit()
+
+    def purge(self, now):
+        purged = db.session.execute(delete(OneTimeCode).where(OneTimeCode.expires_at <= now)).rowcount
+        db.session.commit()
+        return purged
+
+class MemoryOTPBackend:
+    """Codes in a dict in this process, for a single-worker deployment; a restart drops them."""
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = Lock()
+
+    def issue(self, purpose, subject, code, expires_at):
+        with self._lock:
+            self._codes[(purpose, subject)] = [code, 0, expires_at]
+
+    def verify(self, purpose, subject, code, now, max_attempts):
+        with self._lock:
+            entry = self._codes.get((purpose, subject))
+            if entry is None or entry[2] <= now:
+                return EXPIRED
+            if hmac.compare_digest(entry[0], code):
+                return VALID
+            entry[1] += 1
+            if entry[1] >= max_attempts:
+                del self._codes[(purpose, subject)]
+                return LOCKED
+            return INVALID
+
+    def consume(self, purpose, subject):
+        with self._lock:
+            self._codes.pop((purpose, subject), None)
+
+    def purge(self, now):
+        with self._lock:
+            expired = [key for key, entry in self._codes.items() if entry[2] <= now]
+            for key in expired:
+                del self._codes[key]
+        return len(expired)
+
+BACKENDS = {"database": DatabaseOTPBackend, "memory": MemoryOTPBackend}
+
+class OTPStore:
+    """Issues and checks the emailed one-time codes.
+
+    A subject (an email, or a user id for password resets) has at most one
+    live code per purpose; issuing another replaces it. verify() answers
+    VALID, INVALID, EXPIRED or LOCKED. After max_attempts wrong guesses the
+    code is thrown away and a new one has to be requested. A correct code
+    stays usable until consume() is called, so a flow can check it on one
+    page and use it on the next.
+
+    Expired codes are purged at most every purge_interval seconds, from
+    whichever request issues the next code, and by the purge-otps command.
+    """
+
+    def __init__(self, backend="database", ttl=600, max_attempts=5, purge_interval=300):
+        self.backend = BACKENDS[backend]()
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.purge_interval = purge_interval
+        self.purged = 0
+        self._next_purge = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        backend = app.config.get("OTP_BACKEND", "database")
+        if backend not in BACKENDS:
+            raise ValueError(f"OTP_BACKEND must be one of {', '.join(BACKENDS)}")
+        self.backend = BACKENDS[backend]()
+        self.ttl = app.config.get("OTP_TTL", self.ttl)
+        self.max_attempts = app.config.get("OTP_MAX_ATTEMPTS", self.max_attempts)
+        self.purge_interval = app.config.get("OTP_PURGE_INTERVAL", self.purge_interval)
+        app.extensions["otp_store"] = self
+
+    def issue(self, purpose, subject):
+        """Stores a fresh code for the subject and returns it for the email."""
+        code = new_code()
+        self.backend.issue(purpose, str(subject), code, datetime.now() + timedelta(seconds=self.ttl))
+        self._purge_if_due()
+        return code
+
+    def verify(self, purpose, subject, code):
+        return self.backend.verify(purpose, str(subject), (code or "").strip(), datetime.now(), self.max_attempts)
+
+    def consume(self, purpose, subject):
+        self.backend.consume(purpose, str(subject))
+
+    def purge(self):
+        purged = self.backend.purge(datetime.now())
+        with self._lock:
+            self.purged += purged
+        return purged
+
+    def _purge_if_due(self):
+        with self._lock:
+            if time.monotonic() < self._next_purge:
+                return
+            self._next_purge = time.monotonic() + self.purge_interval
+        self.purge()
+
+
+otp_store = OTPStore()
@@ -0,0 +1,104 @@
+from flask import request, url_for
+from models import Doctor, Patient, User
+from sqlalchemy import tuple_
+from sqlalchemy.orm import contains_eager
+from datetime import date, time, datetime
+import base64
+import json
+
+DOCTOR_PAGE_SIZE = 25
+PATIENT_PAGE_SIZE = 50
+SLOT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+class Page:
+    """One page of keyset-paginated rows plus the cursor for the next page."""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+def encode_cursor(values):
+    """Packs the sort key of the last row on a page into a URL-safe token."""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, time)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token, types):
+    """Unpacks a cursor token into a tuple of `types`; returns None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            return None
+        return tuple(
+            t.fromisoformat(v) if t in (date, time, datetime) else t(v)
+            for t, v in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        return None
+
+def get_page_size(default, arg="per_page"):
+    """Reads the requested page size, clamped to 1..MAX_PAGE_SIZE."""
+    per_page = request.args.get(arg, default, type=int)
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+def build_page(rows, per_page, key):
+    """Turns a fetch of per_page + 1 rows into a Page; `key` gives a row's sort key."""
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return Page(rows, encode_cursor(key(rows[-1])) if has_next else None)
+
+def keyset_paginate(query, columns, key, after=None, per_page=DOCTOR_PAGE_SIZE, descending=False):
+    """Returns the page of `query` that comes after the `after` sort key.
+
+    `columns` must be a unique sort key (end it with a primary key) so the row
+    value comparison lands exactly where the previous page stopped.
+    """
+    if after:
+        boundary = tuple_(*columns) < tuple(after) if descending else tuple_(*columns) > tuple(after)
+        query = query.filter(boundary)
+
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    return build_page(rows, per_page, key)
+
+def paginate_doctors(doctors_query, arg="after"):
+    """Pages a Doctor query joined to User and outer-joined to Department by (full_name, doctor_id)."""
+    after = decode_cursor(request.args.get(arg), (str, int))
+    doctors_query = doctors_query.options(contains_eager(Doctor.user), contains_eager(Doctor.department))
+    return keyset_paginate(
+        doctors_query,
+        (User.full_name, Doctor.doctor_id),
+        key=lambda d: (d.user.full_name, d.doctor_id),
+        after=after,
+        per_page=get_page_size(DOCTOR_PAGE_SIZE)
+    )
+
+def paginate_patients(patients_query, arg="after"):
+    """Pages a Patient query joined to User by (full_name, patient_id)."""
+    after = decode_cursor(request.args.get(arg), (str, int))
+    patients_query = patients_query.options(contains_eager(Patient.user))
+    return keyset_paginate(
+        patients_query,
+        (User.full_name, Patient.patient_id),
+        key=lambda p: (p.user.full_name, p.patient_id),
+        after=after,
+        per_page=get_page_size(PATIENT_PAGE_SIZE)
+    )
+
+def page_url(**updates):
+    """Builds the current URL with some query arguments replaced; None drops an argument."""
+    args = request.args.to_dict()
+    args.update(updates)
+    args = {k: v for k, v in args.items() if v is not None}
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
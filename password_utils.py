@@ -0,0 +1,76 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import BoundedSemaphore
+
+class VerifierBusy(Exception):
+    """Raised when the verification pool has no room for another login."""
+
+class PasswordHasher:
+    """Hashes and checks passwords with the configured werkzeug method and cost.
+
+    `method` is anything generate_password_hash accepts, e.g. "scrypt",
+    "scrypt:16384:8:1" or "pbkdf2:sha256:600000". Hashes made with other
+    parameters still verify, and needs_rehash() tells the login path to
+    upgrade them.
+
+    With `verify_workers` > 0, checks run on a pool of that many threads
+    so only that many hashes are ever computed at once and other requests
+    keep getting CPU during a login spike. Up to `verify_queue` more
+    logins can wait for a worker; a login that cannot get a place, or
+    its result, within `verify_timeout` seconds raises VerifierBusy.
+    """
+
+    def __init__(self, method="scrypt", verify_workers=0, verify_queue=32, verify_timeout=5):
+        self.method = method
+        self.verify_workers = verify_workers
+        self.verify_queue = verify_queue
+        self.verify_timeout = verify_timeout
+        self._prefix = None
+        self._pool = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", self.method)
+        self.verify_workers = app.config.get("PASSWORD_VERIFY_WORKERS", self.verify_workers)
+        self.verify_queue = app.config.get("PASSWORD_VERIFY_QUEUE", self.verify_queue)
+        self.verify_timeout = app.config.get("PASSWORD_VERIFY_TIMEOUT", self.verify_timeout)
+        self._prefix = None
+        if self.verify_workers > 0:
+            self._pool = ThreadPoolExecutor(self.verify_workers, thread_name_prefix="password-verify")
+            self._slots = BoundedSemaphore(self.verify_workers + self.verify_queue)
+        app.extensions["password_hasher"] = self
+
+    @property
+    def prefix(self):
+        """The method string new hashes start with, with every cost parameter spelled out."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", method=self.method).split("$", 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def hash_function(self):
+        """A picklable hash(password) for process pools."""
+        return partial(generate_password_hash, method=self.method)
+
+    def needs_rehash(self, stored):
+        return stored.split("$", 1)[0] != self.prefix
+
+    def verify(self, stored, password):
+        if self._pool is None:
+            return check_password_hash(stored, password)
+
+        if not self._slots.acquire(timeout=self.verify_timeout):
+            raise VerifierBusy()
+        #the slot is held until the check finishes, even if this request stops waiting for it
+        future = self._pool.submit(check_password_hash, stored, password)
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(timeout=self.verify_timeout)
+        except TimeoutError:
+            raise VerifierBusy()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,63 @@
+from models import db, SystemStat
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+#deletes slots that repeat a (doctor, date, time) row, keeping the one an appointment holds, else the oldest
+DEDUPE_SLOTS_SQL = """
+DELETE FROM slots
+WHERE NOT EXISTS (SELECT 1 FROM appointments a WHERE a.slot_id = slots.slot_id)
+  AND EXISTS (
+    SELECT 1 FROM slots keep
+    WHERE keep.doctor_id = slots.doctor_id
+      AND keep.date = slots.date
+      AND keep.time = slots.time
+      AND keep.slot_id != slots.slot_id
+      AND (keep.slot_id < slots.slot_id
+           OR EXISTS (SELECT 1 FROM appointments a2 WHERE a2.slot_id = keep.slot_id))
+  )
+"""
+
+#plain DDL rather than an Index object, which would attach itself to the slots table next to the constraint
+SLOT_UNIQUE_INDEX = "uq_slots_doctor_date_time"
+SLOT_UNIQUE_INDEX_SQL = f"CREATE UNIQUE INDEX {SLOT_UNIQUE_INDEX} ON slots (doctor_id, date, time)"
+
+def upgrade_schema():
+    """Adds indexes that create_all leaves out of tables which already exist. Call inside an app context.
+
+    create_all only builds missing tables, so a database started before an
+    index was added to the models never gets it. Every model index is
+    created here if it is missing, system_stats is recreated with its shard
+    column, audit_events.details is widened to TEXT, and
+    uq_slots_doctor_date_time is added as a unique index once duplicate
+    slots are removed. CHECK constraints cannot be added this way and only
+    exist on databases created with them. Safe to run on every start.
+    """
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        #counters from before they were sharded are dropped; startup recounts an empty table
+        if "shard" not in {c["name"] for c in inspect(conn).get_columns("system_stats")}:
+            SystemStat.__table__.drop(conn)
+            SystemStat.__table__.create(conn)
+
+        #audit details used to be a VARCHAR(500); SQLite never enforced the length
+        details = next(c for c in inspect(conn).get_columns("audit_events") if c["name"] == "details")
+        if conn.dialect.name == "postgresql" and getattr(details["type"], "length", None):
+            conn.execute(text("ALTER TABLE audit_events ALTER COLUMN details TYPE TEXT"))
+
+    inspector = inspect(db.engine)
+    names = {ix["name"] for ix in inspector.get_indexes("slots")}
+    names |= {uc["name"] for uc in inspector.get_unique_constraints("slots")}
+    if SLOT_UNIQUE_INDEX in names:
+        return
+
+    try:
+        with db.engine.begin() as conn:
+            removed = conn.execute(text(DEDUPE_SLOTS_SQL)).rowcount
+            conn.execute(text(SLOT_UNIQUE_INDEX_SQL))
+        print(f"Added {SLOT_UNIQUE_INDEX}, removed {removed} duplicate slot(s).")
+    except DBAPIError as e:
+        #two appointments hold the same doctor, date and time; they have to be moved by hand
+        print(f"{SLOT_UNIQUE_INDEX} not created, booked slots are duplicated: {e}")
@@ -0,0 +1,435 @@
+from flask import request, current_app
+from models import db, Appointment, Department, Doctor, Patient, Slot, Treatment, User
+from pagination_utils import keyset_paginate, decode_cursor, get_page_size, Page
+from sqlalchemy import select, func, text, literal, literal_column, and_, or_, case, cast, Float, false, table, column, bindparam
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import contains_eager
+import re
+
+TREATMENT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_TERMS = 8
+PEOPLE_SEARCH_LIMIT = 10
+FUZZY_CANDIDATES = 50
+FUZZY_POSTINGS = 20000
+MIN_SIMILARITY = 0.3
+MIN_TYPEAHEAD_LENGTH = 3
+
+#postgres only uses the GIN index when a query repeats this expression exactly
+PG_TREATMENT_DOCUMENT = (
+    "to_tsvector('english'::regconfig, coalesce(diagnosis, '') || ' ' || "
+    "coalesce(prescription, '') || ' ' || coalesce(notes, ''))"
+)
+
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE treatments_fts USING fts5(
+        diagnosis, prescription, notes,
+        content='treatments', content_rowid='treatment_id'
+    )""",
+    """CREATE TRIGGER treatments_fts_ai AFTER INSERT ON treatments BEGIN
+        INSERT INTO treatments_fts(rowid, diagnosis, prescription, notes)
+        VALUES (new.treatment_id, new.diagnosis, new.prescription, new.notes);
+    END""",
+    """CREATE TRIGGER treatments_fts_ad AFTER DELETE ON treatments BEGIN
+        INSERT INTO treatments_fts(treatments_fts, rowid, diagnosis, prescription, notes)
+        VALUES ('delete', old.treatment_id, old.diagnosis, old.prescription, old.notes);
+    END""",
+    """CREATE TRIGGER treatments_fts_au AFTER UPDATE ON treatments BEGIN
+        INSERT INTO treatments_fts(treatments_fts, rowid, diagnosis, prescription, notes)
+        VALUES ('delete', old.treatment_id, old.diagnosis, old.prescription, old.notes);
+        INSERT INTO treatments_fts(rowid, diagnosis, prescription, notes)
+        VALUES (new.treatment_id, new.diagnosis, new.prescription, new.notes);
+    END""",
+    "INSERT INTO treatments_fts(treatments_fts) VALUES ('rebuild')",
+]
+
+def init_treatment_search(app):
+    """Creates the treatment full-text index if it is missing. Call inside an app context.
+
+    SQLite gets an external-content FTS5 table kept in step with treatments by
+    triggers; PostgreSQL gets a GIN index over a tsvector expression, which the
+    database maintains itself. Anything else falls back to a LIKE scan.
+    """
+    dialect = db.engine.dialect.name
+    backend = "like"
+
+    with db.engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'treatments_fts'")
+            ).first()
+            if not exists:
+                for ddl in SQLITE_FTS_DDL:
+                    conn.execute(text(ddl))
+            backend = "fts5"
+        elif dialect == "postgresql":
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_treatments_search ON treatments USING GIN (({PG_TREATMENT_DOCUMENT}))"
+            ))
+            backend = "tsvector"
+
+    app.extensions["treatment_search"] = backend
+
+def search_terms(q):
+    """Splits free text into word tokens, dropping anything that is query syntax."""
+    return re.findall(r"\w+", (q or "").lower())[:MAX_SEARCH_TERMS]
+
+def treatment_hits(terms):
+    """A subquery of (treatment_id, score) for treatments matching every term; higher scores rank first.
+
+    Each term is matched as a prefix, so "metf" finds metformin.
+    """
+    backend = current_app.extensions.get("treatment_search", "like")
+
+    if backend == "fts5":
+        match = " ".join(f'"{t}"*' for t in terms)
+        #bm25 is lower for better matches
+        return (
+            select(
+                literal_column("treatments_fts.rowid").label("treatment_id"),
+                (-func.bm25(literal_column("treatments_fts"))).label("score")
+            )
+            .select_from(text("treatments_fts"))
+            .where(text("treatments_fts MATCH :match").bindparams(match=match))
+            .subquery("hits")
+        )
+
+    if backend == "tsvector":
+        document = literal_column(PG_TREATMENT_DOCUMENT)
+        query = func.to_tsquery(literal_column("'english'::regconfig"), " & ".join(f"{t}:*" for t in terms))
+        #ts_rank is a float4; as float8 the cursor's score compares equal to the row it came from
+        return (
+            select(Treatment.treatment_id, cast(func.ts_rank(document, query), Float(53)).label("score"))
+            .where(document.op("@@")(query))
+            .subquery("hits")
+        )
+
+    matches = [
+        or_(Treatment.diagnosis.ilike(f"%{t}%"), Treatment.prescription.ilike(f"%{t}%"), Treatment.notes.ilike(f"%{t}%"))
+        for t in terms
+    ]
+    return (
+        select(Treatment.treatment_id, literal(0.0).label("score"))
+        .where(and_(*matches))
+        .subquery("hits")
+    )
+
+def search_treatments(q, doctor_id=None, arg="after"):
+    """Best-first page of treatments matching `q`, with appointment, slot and patient loaded.
+
+    Rows are (Treatment, score) pairs keyed on (score, treatment_id). Pass
+    doctor_id to limit the search to that doctor's appointments.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return Page([])
+
+    hits = treatment_hits(terms)
+    query = (
+        db.session.query(Treatment, hits.c.score)
+        .join(hits, hits.c.treatment_id == Treatment.treatment_id)
+        .join(Appointment, Treatment.appointment_id == Appointment.appointment_id)
+        .join(Patient, Appointment.patient_id == Patient.patient_id)
+        .join(User, Patient.user_id == User.user_id)
+        .outerjoin(Slot, Appointment.slot_id == Slot.slot_id)
+        .options(
+            contains_eager(Treatment.appointment).contains_eager(Appointment.patient).contains_eager(Patient.user),
+            contains_eager(Treatment.appointment).contains_eager(Appointment.slot)
+        )
+    )
+    if doctor_id:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+
+    after = decode_cursor(request.args.get(arg), (float, int))
+    return keyset_paginate(
+        query,
+        (hits.c.score, Treatment.treatment_id),
+        key=lambda row: (row.score, row.Treatment.treatment_id),
+        after=after,
+        per_page=get_page_size(TREATMENT_SEARCH_PAGE_SIZE),
+        descending=True
+    )
+
+#people search: trigram indexes over users' name, email and phone
+
+PG_PEOPLE_DOCUMENT = "lower(full_name || ' ' || email || ' ' || phone_no)"
+
+#admin search_by values that go through the people index, and the users_fts / users column each one matches
+PEOPLE_FIELDS = {"name": "full_name", "email": "email", "phone": "phone_no"}
+
+#names are indexed with a space on each side so every word has start and end trigrams, as in pg_trgm
+SQLITE_PEOPLE_DDL = [
+    """CREATE VIEW users_fts_source AS
+        SELECT user_id, ' ' || full_name || ' ' AS full_name, email, phone_no FROM users""",
+    """CREATE VIRTUAL TABLE users_fts USING fts5(
+        full_name, email, phone_no,
+        content='users_fts_source', content_rowid='user_id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, full_name, email, phone_no)
+        VALUES (new.user_id, ' ' || new.full_name || ' ', new.email, new.phone_no);
+    END""",
+    """CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, full_name, email, phone_no)
+        VALUES ('delete', old.user_id, ' ' || old.full_name || ' ', old.email, old.phone_no);
+    END""",
+    """CREATE TRIGGER users_fts_au AFTER UPDATE OF full_name, email, phone_no ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, full_name, email, phone_no)
+        VALUES ('delete', old.user_id, ' ' || old.full_name || ' ', old.email, old.phone_no);
+        INSERT INTO users_fts(rowid, full_name, email, phone_no)
+        VALUES (new.user_id, ' ' || new.full_name || ' ', new.email, new.phone_no);
+    END""",
+    "INSERT INTO users_fts(users_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE users_fts_vocab USING fts5vocab(users_fts, 'row')",
+]
+
+def init_people_search(app):
+    """Creates the trigram index behind admin patient and doctor lookup. Call inside an app context.
+
+    SQLite gets an FTS5 table with the trigram tokenizer, kept in step by
+    triggers. PostgreSQL gets a pg_trgm GIN index; if the extension cannot be
+    created the search falls back to LIKE scans.
+    """
+    dialect = db.engine.dialect.name
+    backend = "like"
+
+    if dialect == "sqlite":
+        with db.engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+            ).first()
+            if not exists:
+                for ddl in SQLITE_PEOPLE_DDL:
+                    conn.execute(text(ddl))
+        backend = "fts5"
+    elif dialect == "postgresql":
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING GIN (({PG_PEOPLE_DOCUMENT}) gin_trgm_ops)"
+                ))
+            backend = "trgm"
+        except DBAPIError as e:
+            print(f"pg_trgm unavailable, people search will scan: {e}")
+
+    app.extensions["people_search"] = backend
+
+def trigrams(value):
+    """The padded trigrams of each word in `value`, as pg_trgm builds them."""
+    grams = set()
+    for word in re.findall(r"\w+", value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def word_similarity(q, value):
+    """Share of the query's trigrams found in `value`, so a short query is not penalised by a long name."""
+    gq = trigrams(q)
+    return len(gq & trigrams(value)) / len(gq) if gq else 0.0
+
+def fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+users_fts = table("users_fts", column("rowid"), column("rank"))
+
+def name_tier(q):
+    """0 when the name starts with `q`, 1 when `q` is a whole word of it, 2 when a word starts with it, else 3."""
+    name = func.lower(User.full_name)
+    return case(
+        (func.instr(name, q) == 1, 0),
+        (func.instr(" " + name + " ", f" {q} ") > 0, 1),
+        (func.instr(" " + name, f" {q}") > 0, 2),
+        else_=3
+    )
+
+def sqlite_people_hits(match, role, limit, q=None):
+    """(user_id, full_name, email, phone_no, tier, rank) rows from users_fts, best first, cut at `limit`.
+
+    Rows are ordered by bm25; pass the query as `q` to put names that start
+    with it, then names holding it as a word, ahead of the rest.
+    """
+    tier = name_tier(q) if q else literal(3)
+    users = (
+        select(User.user_id, User.full_name, User.email, User.phone_no, tier.label("tier"), users_fts.c.rank)
+        .select_from(users_fts)
+        .join(User, User.user_id == users_fts.c.rowid)
+        .where(text("users_fts MATCH :match").bindparams(match=match))
+    )
+    if role:
+        users = users.where(User.role == role)
+    if q:
+        users = users.order_by(tier)
+    return db.session.execute(users.order_by(users_fts.c.rank, User.full_name, User.user_id).limit(limit)).all()
+
+def in_column(match, name):
+    """Limits an FTS5 match expression to one users_fts column; None leaves it on all of them."""
+    return f"{name} : ({match})" if name else match
+
+def gram_counts(grams):
+    """How many indexed users have each of `grams`; grams nobody has are left out."""
+    return dict(db.session.execute(
+        text("SELECT term, doc FROM users_fts_vocab WHERE term IN :grams").bindparams(bindparam("grams", expanding=True)),
+        {"grams": sorted(grams)}
+    ).all())
+
+def rarest(grams, counts, budget=FUZZY_POSTINGS, keep=2):
+    """The `keep` rarest of a word's grams, plus more while their combined user counts stay within budget."""
+    chosen, total = [], 0
+    for gram in sorted((g for g in grams if g in counts), key=counts.get):
+        if len(chosen) >= keep and total + counts[gram] > budget:
+            break
+        chosen.append(gram)
+        total += counts[gram]
+    return chosen
+
+def search_people(q, role=None, limit=PEOPLE_SEARCH_LIMIT, field=None):
+    """Looks up users by name, email or phone, best match first. Returns (user_id, score) pairs.
+
+    Users containing every word of the query are returned when there are any.
+    Otherwise users sharing enough trigrams with the query are ranked by how
+    many they share, so "jonh smtih" still finds John Smith. `field` ("name",
+    "email" or "phone") looks in that column only.
+    """
+    q = (q or "").strip().lower()
+    if not q:
+        return []
+    backend = current_app.extensions.get("people_search", "like")
+    name = PEOPLE_FIELDS.get(field)
+
+    if backend == "trgm":
+        document = literal_column(PG_PEOPLE_DOCUMENT)
+        target = func.lower(getattr(User, name)) if name else document
+        score = func.word_similarity(q, target)
+        users = select(User.user_id, score.label("score")).where(
+            or_(literal(q).op("<%")(document), document.like(f"%{q}%"))
+        )
+        if name:
+            users = users.where(or_(literal(q).op("<%")(target), target.like(f"%{q}%")))
+        if role:
+            users = users.where(User.role == role)
+        return db.session.execute(users.order_by(score.desc(), User.user_id).limit(limit)).all()
+
+    words = q.split()
+    if backend == "fts5" and all(len(w) >= 3 for w in words):
+        exact = sqlite_people_hits(in_column(" ".join(fts_phrase(w) for w in words), name), role, limit, q=q)
+        if exact:
+            #the name tier leads and bm25 (lower is better) orders within it, squeezed into (0, 1]
+            return [(row.user_id, (3 - row.tier + -row.rank / (1 - row.rank)) / 4) for row in exact]
+
+        #candidates share one of the rarer trigrams of every query word, best bm25 first, then get scored here
+        words = [f" {w} " for w in re.findall(r"\w+", q)]
+        word_grams = [{w[i:i + 3] for i in range(len(w) - 2)} for w in words]
+        counts = gram_counts(set().union(*word_grams))
+        groups = [" OR ".join(fts_phrase(g) for g in rarest(grams, counts)) for grams in word_grams]
+        groups = [f"({group})" for group in groups if group]
+        if not groups:
+            return []
+        candidates = sqlite_people_hits(in_column(" AND ".join(groups), name), role, FUZZY_CANDIDATES)
+        fuzzy = []
+        for row in candidates:
+            values = {"full_name": row.full_name, "email": row.email.split("@")[0], "phone_no": row.phone_no}
+            score = max(word_similarity(q, value) for column, value in values.items() if name in (None, column))
+            if score >= MIN_SIMILARITY:
+                fuzzy.append((row.user_id, score))
+        fuzzy.sort(key=lambda hit: -hit[1])
+        return fuzzy[:limit]
+
+    #queries too short for trigrams, or no index: a prefix match on the indexed name
+    prefixes = {"full_name": User.full_name.ilike(f"{q}%"), "email": User.email.ilike(f"{q}%"), "phone_no": User.phone_no.like(f"{q}%")}
+    users = select(User.user_id, literal(1.0).label("score")).where(
+        prefixes[name] if name else or_(*prefixes.values())
+    )
+    if role:
+        users = users.where(User.role == role)
+    return db.session.execute(users.order_by(User.full_name, User.user_id).limit(limit)).all()
+
+def people_match(q, field=None):
+    """A WHERE clause on User for every user containing the query, unranked, for filters and exports.
+
+    `field` ("name", "email" or "phone") limits the match to that column;
+    without it any of the three may contain the query.
+    """
+    q = (q or "").strip().lower()
+    backend = current_app.extensions.get("people_search", "like")
+    words = q.split()
+    name = PEOPLE_FIELDS.get(field)
+
+    if backend == "fts5" and words and all(len(w) >= 3 for w in words):
+        match = in_column(" ".join(fts_phrase(w) for w in words), name)
+        return User.user_id.in_(
+            select(users_fts.c.rowid).where(text("users_fts MATCH :match").bindparams(match=match))
+        )
+    if name:
+        contains = func.lower(getattr(User, name)).like(f"%{q}%")
+        #the trigram index narrows the rows, the column check keeps the chosen field
+        return and_(literal_column(PG_PEOPLE_DOCUMENT).like(f"%{q}%"), contains) if backend == "trgm" else contains
+    if backend == "trgm":
+        return literal_column(PG_PEOPLE_DOCUMENT).like(f"%{q}%")
+    return or_(User.full_name.ilike(f"%{q}%"), User.email.ilike(f"%{q}%"), User.phone_no.like(f"%{q}%"))
+
+def filter_patients(query, q, search_by):
+    """Applies an admin patient search to a Patient query joined to User."""
+    if not q:
+        return query
+    if search_by in PEOPLE_FIELDS:
+        return query.filter(people_match(q, search_by))
+    if search_by == "id":
+        return query.filter(Patient.patient_id == int(q)) if q.isdigit() else query.filter(false())
+    if search_by == "gender":
+        return query.filter(Patient.gender == q.lower())
+    if search_by == "emergency":
+        return query.filter(Patient.emergency_contact.like(f"{q}%"))
+    if search_by == "status":
+        return query.filter(User.status == q.lower())
+    return query
+
+def filter_doctors(query, q, search_by):
+    """Applies an admin doctor search to a Doctor query joined to User and outer-joined to Department."""
+    if not q:
+        return query
+    if search_by in PEOPLE_FIELDS:
+        return query.filter(people_match(q, search_by))
+    if search_by == "department":
+        return query.filter(Department.name.ilike(f"%{q}%"))
+    if search_by == "status":
+        return query.filter(User.status == q.lower())
+    return query
+
+def ranked_people(query, hits, user_id):
+    """Restricts a query joined to User to the hit users and returns its rows in hit order as one Page."""
+    order = {uid: i for i, (uid, _) in enumerate(hits)}
+    if not order:
+        return Page([])
+    rows = query.filter(User.user_id.in_(order)).all()
+    return Page(sorted(rows, key=lambda row: order[user_id(row)]))
+
+def typeahead_people(q, role=None, limit=PEOPLE_SEARCH_LIMIT):
+    """search_people() results as dicts for the JSON typeahead, with the patient or doctor id."""
+    if len((q or "").strip()) < MIN_TYPEAHEAD_LENGTH:
+        return []
+    hits = search_people(q, role, limit)
+    if not hits:
+        return []
+
+    ids = [user_id for user_id, _ in hits]
+    rows = (
+        db.session.query(User.user_id, User.full_name, User.email, User.role, User.status, Patient.patient_id, Doctor.doctor_id)
+        .outerjoin(Patient, Patient.user_id == User.user_id)
+        .outerjoin(Doctor, Doctor.user_id == User.user_id)
+        .filter(User.user_id.in_(ids))
+        .all()
+    )
+    by_id = {row.user_id: row for row in rows}
+    return [
+        {
+            "user_id": user_id,
+            "patient_id": by_id[user_id].patient_id,
+            "doctor_id": by_id[user_id].doctor_id,
+            "full_name": by_id[user_id].full_name,
+            "email": by_id[user_id].email,
+            "role": by_id[user_id].role,
+            "status": by_id[user_id].status,
+            "score": round(float(score), 3)
+        }
+        for user_id, score in hits if user_id in by_id
+    ]
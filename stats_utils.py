@@ -0,0 +1,309 @@
+from models import db, Department, Doctor, Patient, User, Appointment, SystemStat
+from sqlalchemy import select, func, or_, delete, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import get_history
+from threading import Lock
+import random
+import time
+
+APPOINTMENT_STATUSES = ["Booked", "Completed", "Cancelled"]
+STAT_SHARDS = 16
+
+#system_stats holds running totals kept current by the mapper hooks below.
+#Code that changes these tables with Core UPDATEs bypasses the hooks and calls bump_stats itself.
+#Deletes are counted in before_delete, while the rows the database is about to cascade still exist.
+#Each counter is split over STAT_SHARDS rows so concurrent bookings rarely wait on the same row lock.
+
+def status_stat(status):
+    return f"appointments_{status.lower()}"
+
+def bump_stats(connection, deltas):
+    """Adds each delta to its counter in one upsert per counter.
+
+    `deltas` maps a counter name, or a (name, department_id) pair, to the
+    amount to add. All of them go to one randomly chosen shard, in a fixed
+    order so two transactions never lock the same rows the other way round.
+    Counters that do not exist yet are created.
+    """
+    insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    shard = random.randrange(STAT_SHARDS)
+    keys = sorted((key if isinstance(key, tuple) else (key, 0), delta) for key, delta in deltas.items() if delta)
+    for (name, department_id), delta in keys:
+        stmt = insert(SystemStat).values(name=name, department_id=department_id, shard=shard, value=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name", "department_id", "shard"],
+            set_={"value": SystemStat.value + stmt.excluded.value}
+        )
+        connection.execute(stmt)
+
+def committed(target, attr):
+    """The value `attr` had in the database before this flush."""
+    history = get_history(target, attr)
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(target, attr)
+
+def is_active(connection, user_id):
+    return connection.execute(select(User.status).where(User.user_id == user_id)).scalar() == "active"
+
+@event.listens_for(Department, "after_insert")
+def department_inserted(mapper, connection, target):
+    bump_stats(connection, {"departments": 1})
+
+def cascade_deltas(connection, doctors=None, patients=None):
+    """Counter changes for deleting the doctors and patients matched by these WHERE clauses.
+
+    Their appointments go with them through ON DELETE CASCADE without any
+    mapper hooks firing, so those are counted here too.
+    """
+    deltas = {}
+    def add(key, delta):
+        deltas[key] = deltas.get(key, 0) + delta
+
+    doomed = []
+    if doctors is not None:
+        rows = connection.execute(
+            select(Doctor.department_id, User.status)
+            .outerjoin(User, Doctor.user_id == User.user_id)
+            .where(doctors)
+        )
+        for department_id, status in rows:
+            add("doctors", -1)
+            if status == "active":
+                add("active_doctors", -1)
+                add(("department_active_doctors", department_id or 0), -1)
+        doomed.append(Appointment.doctor_id.in_(select(Doctor.doctor_id).where(doctors)))
+
+    if patients is not None:
+        rows = connection.execute(
+            select(User.status)
+            .select_from(Patient)
+            .outerjoin(User, Patient.user_id == User.user_id)
+            .where(patients)
+        )
+        for (status,) in rows:
+            add("patients", -1)
+            add("active_patients", -int(status == "active"))
+        doomed.append(Appointment.patient_id.in_(select(Patient.patient_id).where(patients)))
+
+    if doomed:
+        by_status = connection.execute(
+            select(Appointment.status, func.count()).where(or_(*doomed)).group_by(Appointment.status)
+        )
+        for status, count in by_status:
+            add(status_stat(status), -count)
+    return deltas
+
+@event.listens_for(Department, "before_delete")
+def department_deleting(mapper, connection, target):
+    deltas = cascade_deltas(connection, doctors=Doctor.department_id == target.department_id)
+    deltas["departments"] = -1
+    bump_stats(connection, deltas)
+
+@event.listens_for(Department, "after_delete")
+def department_deleted(mapper, connection, target):
+    connection.execute(delete(SystemStat).where(SystemStat.department_id == target.department_id))
+
+@event.listens_for(Doctor, "after_insert")
+def doctor_inserted(mapper, connection, target):
+    active = int(is_active(connection, target.user_id))
+    bump_stats(connection, {
+        "doctors": 1,
+        "active_doctors": active,
+        ("department_active_doctors", target.department_id or 0): active
+    })
+
+@event.listens_for(Doctor, "after_update")
+def doctor_updated(mapper, connection, target):
+    history = get_history(target, "department_id")
+    if history.has_changes() and is_active(connection, target.user_id):
+        bump_stats(connection, {
+            ("department_active_doctors", committed(target, "department_id") or 0): -1,
+            ("department_active_doctors", target.department_id or 0): 1
+        })
+
+@event.listens_for(Doctor, "before_delete")
+def doctor_deleting(mapper, connection, target):
+    bump_stats(connection, cascade_deltas(connection, doctors=Doctor.doctor_id == target.doctor_id))
+
+@event.listens_for(Patient, "after_insert")
+def patient_inserted(mapper, connection, target):
+    bump_stats(connection, {"patients": 1, "active_patients": int(is_active(connection, target.user_id))})
+
+@event.listens_for(Patient, "before_delete")
+def patient_deleting(mapper, connection, target):
+    bump_stats(connection, cascade_deltas(connection, patients=Patient.patient_id == target.patient_id))
+
+@event.listens_for(User, "after_insert")
+def user_inserted(mapper, connection, target):
+    bump_stats(connection, {"active_users": int(target.status == "active")})
+
+@event.listens_for(User, "after_update")
+def user_updated(mapper, connection, target):
+    was_active = committed(target, "status") == "active"
+    if was_active == (target.status == "active"):
+        return
+    bump_stats(connection, user_status_deltas(connection, [target.user_id], 1 if target.status == "active" else -1))
+
+@event.listens_for(User, "before_delete")
+def user_deleting(mapper, connection, target):
+    #a doctor or patient row the session deleted itself is already gone and is not counted twice
+    deltas = cascade_deltas(
+        connection,
+        doctors=Doctor.user_id == target.user_id,
+        patients=Patient.user_id == target.user_id
+    )
+    deltas["active_users"] = -int(is_active(connection, target.user_id))
+    bump_stats(connection, deltas)
+
+def user_status_deltas(connection, user_ids, delta):
+    """Counter changes for `user_ids` all becoming active (delta 1) or inactive (delta -1)."""
+    deltas = {"active_users": delta * len(user_ids)}
+    doctor_departments = connection.execute(
+        select(Doctor.department_id).where(Doctor.user_id.in_(user_ids))
+    ).scalars().all()
+    deltas["active_doctors"] = delta * len(doctor_departments)
+    for department_id in doctor_departments:
+        key = ("department_active_doctors", department_id or 0)
+        deltas[key] = deltas.get(key, 0) + delta
+    deltas["active_patients"] = delta * connection.execute(
+        select(func.count()).select_from(Patient).where(Patient.user_id.in_(user_ids))
+    ).scalar()
+    return deltas
+
+@event.listens_for(Appointment, "after_insert")
+def appointment_inserted(mapper, connection, target):
+    bump_stats(connection, {status_stat(target.status): 1})
+
+@event.listens_for(Appointment, "after_update")
+def appointment_updated(mapper, connection, target):
+    old_status = committed(target, "status")
+    if old_status != target.status:
+        bump_stats(connection, {status_stat(old_status): -1, status_stat(target.status): 1})
+
+@event.listens_for(Appointment, "after_delete")
+def appointment_deleted(mapper, connection, target):
+    bump_stats(connection, {status_stat(committed(target, "status")): -1})
+
+def count_of(*entities, where=None):
+    """A scalar COUNT(*) subquery over the given join."""
+    query = select(func.count()).select_from(entities[0])
+    for entity in entities[1:]:
+        query = query.join(entity)
+    if where is not None:
+        query = query.where(where)
+    return query.scalar_subquery()
+
+def count_stats():
+    """Recomputes every counter from the tables themselves, in three queries."""
+    totals = db.session.execute(select(
+        count_of(Department).label("departments"),
+        count_of(Doctor).label("doctors"),
+        count_of(Patient).label("patients"),
+        count_of(User, where=User.status == "active").label("active_users"),
+        count_of(Doctor, User, where=User.status == "active").label("active_doctors"),
+        count_of(Patient, User, where=User.status == "active").label("active_patients")
+    )).one()
+    counters = totals._asdict()
+
+    for status in APPOINTMENT_STATUSES:
+        counters[status_stat(status)] = 0
+    for status, count in db.session.query(Appointment.status, func.count()).group_by(Appointment.status):
+        counters[status_stat(status)] = count
+
+    #doctors without a department are kept under department 0 so the hooks can move them
+    departments = (
+        db.session.query(Doctor.department_id, func.count())
+        .join(User, Doctor.user_id == User.user_id)
+        .filter(User.status == "active")
+        .group_by(Doctor.department_id)
+    )
+    for department_id, count in departments:
+        counters[("department_active_doctors", department_id or 0)] = count
+    return counters
+
+def rebuild_stats():
+    """Replaces the contents of system_stats with freshly counted values, one shard per counter."""
+    counters = count_stats()
+    db.session.execute(delete(SystemStat))
+    db.session.add_all(
+        SystemStat(name=key[0], department_id=key[1], value=value) if isinstance(key, tuple)
+        else SystemStat(name=key, department_id=0, value=value)
+        for key, value in counters.items()
+    )
+    db.session.commit()
+    stats_cache.invalidate()
+    return counters
+
+def read_dashboard_stats():
+    """Every number on the admin dashboard, read from system_stats in two queries that sum the shards."""
+    counters = dict(
+        db.session.query(SystemStat.name, func.sum(SystemStat.value))
+        .filter(SystemStat.department_id == 0, SystemStat.name != "department_active_doctors")
+        .group_by(SystemStat.name)
+    )
+    department_totals = (
+        select(SystemStat.department_id, func.sum(SystemStat.value).label("value"))
+        .where(SystemStat.name == "department_active_doctors")
+        .group_by(SystemStat.department_id)
+        .subquery()
+    )
+    departments = (
+        db.session.query(Department.name, func.coalesce(department_totals.c.value, 0))
+        .outerjoin(department_totals, department_totals.c.department_id == Department.department_id)
+        .order_by(Department.name)
+        .all()
+    )
+    by_status = {status: counters.get(status_stat(status), 0) for status in APPOINTMENT_STATUSES}
+
+    return {
+        "total_departments": counters.get("departments", 0),
+        "total_doctors": counters.get("doctors", 0),
+        "total_patients": counters.get("patients", 0),
+        "total_appointments": sum(by_status.values()),
+        "chart_active_patients": counters.get("active_patients", 0),
+        "chart_active_doctors": counters.get("active_doctors", 0),
+        "chart_dept_labels": [name for name, _ in departments],
+        "chart_dept_counts": [count for _, count in departments],
+        "chart_booked": by_status["Booked"],
+        "chart_completed": by_status["Completed"],
+        "chart_cancelled": by_status["Cancelled"]
+    }
+
+class StatsCache:
+    """Keeps the last dashboard stats for `ttl` seconds so concurrent admins share one computation.
+
+    Numbers can be up to `ttl` seconds old. A ttl of 0 turns the cache off.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("ADMIN_STATS_TTL", self.ttl)
+        app.extensions["stats_cache"] = self
+
+    def get(self, compute):
+        """Returns the cached stats, calling `compute` when they are missing or expired."""
+        if self.ttl <= 0:
+            return compute()
+
+        #only one request recomputes; the rest wait and reuse its result
+        with self._lock:
+            if self._value is None or time.monotonic() >= self._expires:
+                self._value = compute()
+                self._expires = time.monotonic() + self.ttl
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+stats_cache = StatsCache()
+
+def dashboard_stats():
+    return stats_cache.get(read_dashboard_stats)
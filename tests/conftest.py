@@ -0,0 +1,13 @@
+import pytest
+from support import load_app
+
+flask_app = load_app()
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        yield flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
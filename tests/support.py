@@ -0,0 +1,174 @@
+"""Shared setup for the tests and benchmarks: the app on a throwaway database, row factories and a query counter."""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_serial = itertools.count(1)
+
+def load_app():
+    """Imports the app against TEST_DB_URI, or a new SQLite file, with emails switched off.
+
+    Must run before anything imports app. Passwords are hashed with a cheap
+    method unless TEST_PASSWORD_HASH_METHOD says otherwise.
+    """
+    os.environ["DB_URI"] = os.environ.get("TEST_DB_URI") or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "mediconnect.db")
+    os.environ["PASSWORD_HASH_METHOD"] = os.environ.get("TEST_PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    os.environ.setdefault("SECRET_KEY", "test")
+    os.environ.setdefault("ADMIN_EMAIL", "admin@mediconnect.test")
+    os.environ.setdefault("ADMIN_PASSWORD", "admin")
+    os.environ.setdefault("MAIL_SENDER_EMAIL", "noreply@mediconnect.test")
+
+    import email_utils
+    email_utils.send_email = lambda *args, **kwargs: None
+
+    from app import app
+    return app
+
+def make_department(name=None):
+    from models import db, Department
+    department = Department(name=name or f"Department {next(_serial)}", description="")
+    db.session.add(department)
+    db.session.commit()
+    return department
+
+def make_user(role, password="pw", status="active"):
+    from models import db, User
+    from password_utils import password_hasher
+    n = next(_serial)
+    user = User(
+        full_name=f"{role.title()} {n}",
+        email=f"{role}{n}@mediconnect.test",
+        password=password_hasher.hash(password),
+        role=role,
+        phone_no=f"555{n:07d}",
+        status=status
+    )
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+def make_doctor(department=None, **user_args):
+    from models import db, Doctor
+    department = department or make_department()
+    doctor = Doctor(user_id=make_user("doctor", **user_args).user_id, department_id=department.department_id, qualification="MD", experience_years=5)
+    db.session.add(doctor)
+    db.session.commit()
+    return doctor
+
+def make_patient(**user_args):
+    from models import db, Patient
+    patient = Patient(
+        user_id=make_user("patient", **user_args).user_id,
+        dob=date(1990, 1, 1), gender="female", address="1 Test Street", blood_group="O+", emergency_contact="5550000000"
+    )
+    db.session.add(patient)
+    db.session.commit()
+    return patient
+
+def make_slots(doctor_id, days=1, per_day=8, start=None):
+    """Adds per_day half-hourly slots from 08:00 on each of `days` days from `start` (tomorrow). Returns their ids."""
+    from models import db, Slot
+    start = start or date.today() + timedelta(days=1)
+    slots = [
+        Slot(doctor_id=doctor_id, date=start + timedelta(days=d), time=(datetime.combine(start, time(8)) + timedelta(minutes=30 * h)).time(), status="Available")
+        for d in range(days)
+        for h in range(per_day)
+    ]
+    db.session.add_all(slots)
+    db.session.commit()
+    return [s.slot_id for s in slots]
+
+def seed_bulk(departments, doctors_per_department, appointments, treatments=False):
+    """Bulk-inserts departments, doctors, patients and past appointments with Core statements.
+
+    Every seventh user is inactive. Each appointment gets its own slot, and
+    a treatment when `treatments` is set. system_stats is recounted once at
+    the end. Returns the new department ids.
+    """
+    from models import db, Department, Doctor, Patient, User, Slot, Appointment, Treatment
+    from stats_utils import rebuild_stats
+    from sqlalchemy import insert, select
+    tag = f"bulk{next(_serial)}"
+
+    db.session.execute(insert(Department), [{"name": f"{tag} department {i:04d}", "description": ""} for i in range(departments)])
+    department_ids = db.session.scalars(select(Department.department_id).where(Department.name.like(f"{tag} %"))).all()
+
+    counts = {"doctor": departments * doctors_per_department, "patient": max(1, appointments // 10)}
+    db.session.execute(insert(User), [
+        {"full_name": f"{tag} {role} {i}", "email": f"{tag}-{role}-{i}@mediconnect.test", "password": "-",
+         "role": role, "phone_no": "5550000000", "status": "active" if i % 7 else "inactive"}
+        for role, count in counts.items()
+        for i in range(count)
+    ])
+    doctor_users = db.session.scalars(select(User.user_id).where(User.email.like(f"{tag}-doctor-%")).order_by(User.user_id)).all()
+    patient_users = db.session.scalars(select(User.user_id).where(User.email.like(f"{tag}-patient-%")).order_by(User.user_id)).all()
+
+    db.session.execute(insert(Doctor), [
+        {"user_id": u, "department_id": department_ids[i % departments], "qualification": "MD", "experience_years": 1}
+        for i, u in enumerate(doctor_users)
+    ])
+    db.session.execute(insert(Patient), [
+        {"user_id": u, "dob": date(1990, 1, 1), "gender": "female", "address": "-", "blood_group": "O+", "emergency_contact": "-"}
+        for u in patient_users
+    ])
+    doctor_ids = db.session.scalars(select(Doctor.doctor_id).where(Doctor.user_id.in_(doctor_users)).order_by(Doctor.doctor_id)).all()
+    patient_ids = db.session.scalars(select(Patient.patient_id).where(Patient.user_id.in_(patient_users)).order_by(Patient.patient_id)).all()
+
+    #the n-th slot of a doctor is half-hourly from 08:00, sixteen a day, counting from 400 days ago
+    first_day = datetime.combine(date.today() - timedelta(days=400), time(8))
+    def when(n):
+        return first_day + timedelta(days=n // 16, minutes=30 * (n % 16))
+    db.session.execute(insert(Slot), [
+        {"doctor_id": doctor_ids[i % len(doctor_ids)], "date": when(i // len(doctor_ids)).date(), "time": when(i // len(doctor_ids)).time(), "status": "Booked"}
+        for i in range(appointments)
+    ])
+    slots = db.session.execute(
+        select(Slot.slot_id, Slot.doctor_id).where(Slot.doctor_id.in_(doctor_ids)).order_by(Slot.slot_id)
+    ).all()
+    statuses = ["Completed", "Completed", "Booked"]
+    db.session.execute(insert(Appointment), [
+        {"patient_id": patient_ids[i % len(patient_ids)], "doctor_id": doctor_id, "slot_id": slot_id,
+         "status": statuses[i % 3], "created_at": datetime.now()}
+        for i, (slot_id, doctor_id) in enumerate(slots)
+    ])
+    if treatments:
+        appointment_ids = db.session.scalars(select(Appointment.appointment_id).where(Appointment.doctor_id.in_(doctor_ids))).all()
+        db.session.execute(insert(Treatment), [
+            {"appointment_id": a, "diagnosed_by": "-", "diagnosis": "seasonal flu", "prescription": "rest", "notes": ""}
+            for a in appointment_ids
+        ])
+    db.session.commit()
+    rebuild_stats()
+    return department_ids
+
+def sign_in(client, user):
+    """Fakes a signed-in doctor or patient session for the test client."""
+    with client.session_transaction() as session:
+        session["user_id"] = user.user_id
+        session["role"] = user.role
+
+class QueryCounter:
+    """Counts the statements an engine executes inside a `with` block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, "before_cursor_execute", self._count)
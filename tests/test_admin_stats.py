@@ -0,0 +1,51 @@
+from models import db, Appointment
+from booking_utils import book_slot, blacklist_users
+from stats_utils import count_stats, read_dashboard_stats, stats_cache
+from support import make_department, make_doctor, make_patient, make_slots, QueryCounter
+
+def assert_counters_match_tables():
+    stored = read_dashboard_stats()
+    counted = count_stats()
+    assert stored["total_departments"] == counted["departments"]
+    assert stored["total_doctors"] == counted["doctors"]
+    assert stored["total_patients"] == counted["patients"]
+    assert stored["chart_active_doctors"] == counted["active_doctors"]
+    assert stored["chart_active_patients"] == counted["active_patients"]
+    assert stored["chart_booked"] == counted["appointments_booked"]
+    assert stored["chart_completed"] == counted["appointments_completed"]
+    assert stored["chart_cancelled"] == counted["appointments_cancelled"]
+
+def test_counters_follow_bookings_status_changes_and_blacklisting(app):
+    department = make_department()
+    doctors = [make_doctor(department) for _ in range(2)]
+    patients = [make_patient() for _ in range(4)]
+    for doctor in doctors:
+        for i, slot_id in enumerate(make_slots(doctor.doctor_id, per_day=6)):
+            book_slot(patients[i % 4].patient_id, slot_id, doctor.doctor_id)
+    assert_counters_match_tables()
+
+    appointment = Appointment.query.filter_by(doctor_id=doctors[0].doctor_id).first()
+    appointment.status = "Completed"
+    db.session.commit()
+    blacklist_users([doctors[1].user_id, patients[0].user_id])
+    assert_counters_match_tables()
+
+    db.session.delete(department)
+    db.session.commit()
+    assert_counters_match_tables()
+
+def test_admin_dashboard_statements_do_not_grow_with_departments(app, client):
+    with client.session_transaction() as session:
+        session["admin_id"] = 1
+
+    def statements():
+        stats_cache.invalidate()
+        with QueryCounter(db.engine) as counter:
+            assert client.get("/admin/dashboard").status_code == 200
+        return counter.count
+
+    before = statements()
+    for _ in range(20):
+        make_doctor(make_department())
+    #the admin, then the counters and the per-department counts
+    assert statements() == before <= 3
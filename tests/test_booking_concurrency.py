@@ -0,0 +1,70 @@
+from threading import Thread, Lock
+import random
+from models import db, Appointment, Slot
+from booking_utils import book_slot, swap_slot
+from support import make_doctor, make_patient, make_slots
+
+def run_threads(target, args_list):
+    threads = [Thread(target=target, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_concurrent_bookings_never_share_a_slot(app):
+    doctor_id = make_doctor().doctor_id
+    patient_ids = [make_patient().patient_id for _ in range(12)]
+    slot_ids = make_slots(doctor_id, per_day=4)
+    wins, lock = [], Lock()
+
+    #every patient tries every slot at the same time
+    def book_all(patient_id):
+        with app.app_context():
+            for slot_id in slot_ids:
+                if book_slot(patient_id, slot_id, doctor_id):
+                    with lock:
+                        wins.append(slot_id)
+
+    run_threads(book_all, [(p,) for p in patient_ids])
+
+    assert sorted(wins) == sorted(slot_ids)
+    held = db.session.query(Appointment.slot_id).filter_by(doctor_id=doctor_id, status="Booked").all()
+    assert sorted(s for (s,) in held) == sorted(slot_ids)
+    assert Slot.query.filter(Slot.slot_id.in_(slot_ids), Slot.status != "Booked").count() == 0
+
+def test_booking_a_taken_slot_fails(app):
+    doctor_id = make_doctor().doctor_id
+    first, second = make_patient().patient_id, make_patient().patient_id
+    (slot_id,) = make_slots(doctor_id, per_day=1)
+
+    assert book_slot(first, slot_id, doctor_id) is not None
+    assert book_slot(second, slot_id, doctor_id) is None
+    assert Appointment.query.filter_by(slot_id=slot_id).count() == 1
+
+def test_concurrent_reschedules_keep_slots_and_appointments_in_step(app):
+    doctor_id = make_doctor().doctor_id
+    slot_ids = make_slots(doctor_id, per_day=6)
+    appointment_ids = [book_slot(make_patient().patient_id, slot_ids[i], doctor_id).appointment_id for i in range(4)]
+
+    moves, lock = [0], Lock()
+
+    #two threads per appointment keep moving it around a pool of six slots
+    def reschedule(appointment_id, seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            for _ in range(40):
+                appointment = db.session.get(Appointment, appointment_id)
+                if swap_slot(appointment_id, appointment.slot, rng.choice(slot_ids), doctor_id):
+                    with lock:
+                        moves[0] += 1
+                db.session.expire_all()
+
+    run_threads(reschedule, [(a, i) for i, a in enumerate(appointment_ids * 2)])
+
+    db.session.expire_all()
+    held = [a.slot_id for a in Appointment.query.filter(Appointment.appointment_id.in_(appointment_ids))]
+    booked = [s for (s,) in db.session.query(Slot.slot_id).filter(Slot.slot_id.in_(slot_ids), Slot.status == "Booked")]
+    assert moves[0] > 0
+    assert None not in held
+    assert len(set(held)) == len(appointment_ids)
+    assert sorted(held) == sorted(booked)
@@ -0,0 +1,74 @@
+from models import db, Department, Doctor, Patient, Slot, Appointment, Treatment
+from booking_utils import book_slot
+from availability_utils import availability_cache
+from support import make_doctor, make_patient, make_slots, seed_bulk, sign_in, QueryCounter
+
+NO_ORPHANS = {"doctors": 0, "slots": 0, "appointments": 0, "treatments": 0, "unheld_booked_slots": 0}
+
+def orphans():
+    """Rows whose parent is gone, and Booked slots no appointment holds; a delete should leave none."""
+    return {
+        "doctors": Doctor.query.filter(Doctor.department_id.isnot(None), ~Doctor.department.has()).count(),
+        "slots": Slot.query.filter(~Slot.doctor.has()).count(),
+        "appointments": Appointment.query.filter(~Appointment.patient.has() | ~Appointment.doctor.has()).count(),
+        "treatments": Treatment.query.filter(~Treatment.appointment.has()).count(),
+        "unheld_booked_slots": Slot.query.filter(
+            Slot.status == "Booked", ~Slot.appointment.has(Appointment.status.in_(["Booked", "Completed"]))
+        ).count(),
+    }
+
+def test_department_delete_cascades_in_the_database(app, client):
+    (small,) = seed_bulk(1, 3, 30, treatments=True)
+    (large,) = seed_bulk(1, 3, 600, treatments=True)
+    with client.session_transaction() as session:
+        session["admin_id"] = 1
+
+    def delete(department_id):
+        with QueryCounter(db.engine) as counter:
+            client.post(f"/admin/delete-department/{department_id}")
+        assert db.session.get(Department, department_id) is None
+        return counter.count
+
+    #the children are never loaded, so twenty times the appointments cost the same statements
+    assert delete(small) == delete(large)
+    assert orphans() == NO_ORPHANS
+
+def test_patient_account_delete_takes_appointments_and_treatments(app, client):
+    seed_bulk(1, 2, 40, treatments=True)
+    patient = Patient.query.join(Appointment).first()
+    patient_id, user = patient.patient_id, patient.user
+    sign_in(client, user)
+    assert Appointment.query.filter_by(patient_id=patient_id).count() > 0
+
+    client.post("/patient/delete-account")
+
+    assert Appointment.query.filter_by(patient_id=patient_id).count() == 0
+    assert orphans() == NO_ORPHANS
+
+def test_doctor_removal_takes_slots_and_appointments(app, client):
+    seed_bulk(1, 2, 40, treatments=True)
+    doctor_id = Doctor.query.join(Appointment).first().doctor_id
+    with client.session_transaction() as session:
+        session["admin_id"] = 1
+
+    client.post(f"/admin/remove-doctor/{doctor_id}")
+
+    assert Appointment.query.filter_by(doctor_id=doctor_id).count() == 0
+    assert Slot.query.filter_by(doctor_id=doctor_id).count() == 0
+    assert orphans() == NO_ORPHANS
+
+def test_removing_a_patient_hands_their_booked_slot_back(app, client):
+    doctor_id = make_doctor().doctor_id
+    slot_id = make_slots(doctor_id, per_day=3)[0]
+    patient_id = make_patient().patient_id
+    assert book_slot(patient_id, slot_id, doctor_id)
+    assert slot_id not in [s.slot_id for s in availability_cache.get(doctor_id)]
+    with client.session_transaction() as session:
+        session["admin_id"] = 1
+
+    client.post(f"/admin/remove-patient/{patient_id}")
+
+    db.session.expire_all()
+    assert db.session.get(Slot, slot_id).status == "Available"
+    assert slot_id in [s.slot_id for s in availability_cache.get(doctor_id)]
+    assert book_slot(make_patient().patient_id, slot_id, doctor_id)
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+import os
+import sqlite3
+import subprocess
+import sys
+import pytest
+from models import db, Slot
+from booking_utils import bulk_clone_slots
+from support import make_doctor, make_slots
+
+def test_clone_skips_existing_slots(app):
+    doctor_id = make_doctor().doctor_id
+    source = date.today() + timedelta(days=1)
+    make_slots(doctor_id, per_day=4, start=source)
+    make_slots(doctor_id, per_day=2, start=source + timedelta(days=2))
+
+    assert bulk_clone_slots(doctor_id, source, source + timedelta(days=1), source + timedelta(days=3)) == (10, 2)
+    assert bulk_clone_slots(doctor_id, source, source + timedelta(days=1), source + timedelta(days=3)) == (0, 12)
+    assert Slot.query.filter_by(doctor_id=doctor_id).count() == 16
+
+def test_clone_with_no_source_slots(app):
+    doctor_id = make_doctor().doctor_id
+    day = date.today() + timedelta(days=1)
+    assert bulk_clone_slots(doctor_id, day, day, day + timedelta(days=5)) is None
+
+#the slots table as the first release created it, without uq_slots_doctor_date_time
+LEGACY_SLOTS_DDL = """CREATE TABLE slots (
+    slot_id INTEGER NOT NULL,
+    doctor_id INTEGER,
+    date DATE NOT NULL,
+    time TIME NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    PRIMARY KEY (slot_id),
+    FOREIGN KEY(doctor_id) REFERENCES doctors (doctor_id) ON DELETE CASCADE
+)"""
+
+LEGACY_CHECK = """
+from support import load_app, make_doctor
+app = load_app()
+from datetime import date, timedelta
+from models import Slot
+from booking_utils import bulk_clone_slots
+with app.app_context():
+    doctor_id = make_doctor().doctor_id
+    source = date.today() + timedelta(days=1)
+    print(Slot.query.count(), bulk_clone_slots(doctor_id, source, source, source + timedelta(days=2)))
+"""
+
+def test_clone_on_a_database_from_before_the_unique_constraint(app, tmp_path):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("builds the old table with sqlite3")
+    path = tmp_path / "legacy.db"
+    day = (date.today() + timedelta(days=1)).isoformat()
+    with sqlite3.connect(path) as conn:
+        conn.execute(LEGACY_SLOTS_DDL)
+        #three copies of the same 09:00 slot for the doctor created below
+        conn.executemany("INSERT INTO slots (doctor_id, date, time, status) VALUES (1, ?, ?, 'Available')", [(day, "09:00:00.000000")] * 3 + [(day, "10:00:00.000000")])
+
+    env = dict(os.environ, TEST_DB_URI=f"sqlite:///{path}")
+    result = subprocess.run(
+        [sys.executable, "-c", LEGACY_CHECK], env=env, cwd=os.path.dirname(__file__),
+        capture_output=True, text=True, check=True
+    )
+
+    #startup collapsed the duplicates, then the clone added the two new days and skipped the source day
+    assert result.stdout.splitlines()[-1] == "2 (4, 2)"
+    with sqlite3.connect(path) as conn:
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "uq_slots_doctor_date_time" in indexes
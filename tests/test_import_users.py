@@ -0,0 +1,25 @@
+from models import Patient, User
+from import_utils import import_users, IMPORT_COLUMNS
+from search_utils import filter_patients
+
+def patient_csv(rows):
+    lines = [",".join(IMPORT_COLUMNS["patient"])]
+    for i, gender in rows:
+        lines.append(f"Imported {i},imported{i}@mediconnect.test,555{i:07d},1990-01-01,{gender},O+,1 Test Street,5550000000")
+    return lines
+
+def test_patient_import_normalises_gender_and_rejects_unknown_values(app, monkeypatch):
+    monkeypatch.setitem(app.config, "IMPORT_HASH_WORKERS", 1)
+
+    result = import_users("patient", patient_csv([(9001, "Male"), (9002, " FEMALE "), (9003, "other"), (9004, "F")]), send_emails=False)
+
+    assert result.created == 3
+    assert result.errors == [(5, "gender must be one of male, female, other")]
+    stored = dict(Patient.query.join(User).filter(User.email.like("imported900%")).with_entities(User.email, Patient.gender))
+    assert stored == {
+        "imported9001@mediconnect.test": "male",
+        "imported9002@mediconnect.test": "female",
+        "imported9003@mediconnect.test": "other",
+    }
+    found = filter_patients(Patient.query.join(User), "Male", "gender").filter(User.email.like("imported900%")).all()
+    assert [p.user.email for p in found] == ["imported9001@mediconnect.test"]
@@ -0,0 +1,61 @@
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from password_utils import password_hasher, PasswordHasher, VerifierBusy
+from support import make_patient
+
+def test_hash_verifies_and_only_other_parameters_need_rehash():
+    stored = password_hasher.hash("secret")
+    assert password_hasher.verify(stored, "secret")
+    assert not password_hasher.verify(stored, "wrong")
+    assert not password_hasher.needs_rehash(stored)
+    assert password_hasher.needs_rehash(generate_password_hash("secret", method="pbkdf2:sha256:500"))
+
+def login(client, email, password):
+    return client.post("/login", data={"email": email, "password": password})
+
+def test_login_upgrades_an_old_hash(app, client):
+    user = make_patient().user
+    user.password = generate_password_hash("secret", method="pbkdf2:sha256:500")
+    db.session.commit()
+    user_id, email = user.user_id, user.email
+
+    assert login(client, email, "secret").status_code == 302
+    db.session.expire_all()
+    stored = db.session.get(User, user_id).password
+    assert not password_hasher.needs_rehash(stored)
+    assert password_hasher.verify(stored, "secret")
+
+def test_wrong_password_leaves_the_hash_alone(app, client):
+    user = make_patient().user
+    old = generate_password_hash("secret", method="pbkdf2:sha256:500")
+    user.password = old
+    db.session.commit()
+
+    assert login(client, user.email, "wrong").status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, user.user_id).password == old
+
+def make_hasher(**config):
+    hasher = PasswordHasher()
+    flask_app = Flask(__name__)
+    flask_app.config.update(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000", **config)
+    hasher.init_app(flask_app)
+    return hasher
+
+def test_verify_pool_checks_passwords():
+    hasher = make_hasher(PASSWORD_VERIFY_WORKERS=1)
+    stored = hasher.hash("secret")
+    assert hasher.verify(stored, "secret")
+    assert not hasher.verify(stored, "wrong")
+
+def test_verify_pool_turns_away_what_it_cannot_finish_in_time():
+    hasher = make_hasher(PASSWORD_VERIFY_WORKERS=1, PASSWORD_VERIFY_QUEUE=0, PASSWORD_VERIFY_TIMEOUT=0.01)
+    slow = generate_password_hash("secret", method="pbkdf2:sha256:2000000")
+    with pytest.raises(VerifierBusy):
+        hasher.verify(slow, "secret")
+    #the worker is still busy with that check, so there is no slot for another
+    with pytest.raises(VerifierBusy):
+        hasher.verify(hasher.hash("secret"), "secret")
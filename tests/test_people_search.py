@@ -0,0 +1,23 @@
+from models import db
+from search_utils import search_people, PEOPLE_SEARCH_LIMIT
+from support import make_patient
+
+def name_patient(full_name):
+    patient = make_patient()
+    patient.user.full_name = full_name
+    db.session.commit()
+    return patient.user_id
+
+def test_exact_matches_rank_before_the_limit(app):
+    #more names contain the query than fit in one result, and the best ones are added last
+    for i in range(PEOPLE_SEARCH_LIMIT * 2):
+        name_patient(f"Goldsmith {i:02d}")
+    whole_word = name_patient("John Smith")
+    prefix = name_patient("Smithers Jones")
+
+    hits = search_people("smith", "patient", PEOPLE_SEARCH_LIMIT)
+
+    assert len(hits) == PEOPLE_SEARCH_LIMIT
+    assert [user_id for user_id, _ in hits[:2]] == [prefix, whole_word]
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True) and 0 < scores[-1] < scores[0] <= 1
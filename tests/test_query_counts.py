@@ -0,0 +1,35 @@
+import pytest
+from models import db
+from booking_utils import book_slot
+from support import make_doctor, make_patient, make_slots, sign_in, QueryCounter
+
+def doctor_with_appointments(days):
+    doctor = make_doctor()
+    patients = [make_patient() for _ in range(5)]
+    for i, slot_id in enumerate(make_slots(doctor.doctor_id, days=days)):
+        appointment = book_slot(patients[i % 5].patient_id, slot_id, doctor.doctor_id)
+        if i % 3 == 0:
+            appointment.status = "Completed"
+            db.session.commit()
+    return doctor
+
+def statements(client, url):
+    with QueryCounter(db.engine) as counter:
+        assert client.get(url).status_code == 200
+    return counter.count
+
+@pytest.mark.parametrize("url", [
+    "/doctor/dashboard",
+    "/doctor/dashboard?search=Patient&search_by=patient",
+    "/doctor/dashboard?search=Booked&search_by=status",
+])
+def test_doctor_dashboard_query_count_is_capped(app, client, url):
+    #one query loads the signed-in doctor, one the counts and chart, one the listed appointments
+    sign_in(client, doctor_with_appointments(days=1).user)
+    few = statements(client, url)
+
+    sign_in(client, doctor_with_appointments(days=6).user)
+    many = statements(client, url)
+
+    assert few <= 3
+    assert many == few
@@ -0,0 +1,32 @@
+from datetime import date, time, timedelta
+import pytest
+from sqlalchemy import text
+from models import db, Slot
+from availability_utils import free_slots_query, availability_cache
+from support import make_doctor, make_slots
+
+def query_plan(query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    return " ".join(row[-1] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+def test_free_slots_use_the_composite_index(app):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("the plan check reads SQLite's EXPLAIN QUERY PLAN")
+    doctor_id = make_doctor().doctor_id
+    make_slots(doctor_id, days=3)
+
+    plan = query_plan(free_slots_query(doctor_id, availability_cache.window()))
+    assert "USING INDEX ix_slots_doctor_status_date_time" in plan or "USING COVERING INDEX ix_slots_doctor_status_date_time" in plan
+    assert "SCAN" not in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_free_slots_stay_inside_the_window(app):
+    doctor_id = make_doctor().doctor_id
+    inside = make_slots(doctor_id, per_day=2)
+    db.session.add_all([
+        Slot(doctor_id=doctor_id, date=date.today() - timedelta(days=30), time=time(9), status="Available"),
+        Slot(doctor_id=doctor_id, date=availability_cache.window()[1] + timedelta(days=1), time=time(9), status="Available")
+    ])
+    db.session.commit()
+
+    assert sorted(s.slot_id for s in availability_cache.get(doctor_id)) == sorted(inside)